@@ -3,25 +3,66 @@
 # This program is licensed under the Apache License version 2.
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
+import os
+import math
 import numpy as np
 import cv2
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from collections import deque
+import multiprocessing as mp
+from multiprocessing.pool import ThreadPool, AsyncResult
+from queue import Queue, Full
+from threading import Thread, Event
 import fitz
 from weasyprint import HTML
-from typing import List, Tuple, Optional, Any, Union, Sequence
+from .elements import Word, Line, Block, Page
+from typing import List, Tuple, Optional, Any, Union, Sequence, Iterator, Iterable, Dict, Deque
 
-__all__ = ['read_pdf', 'read_img', 'read_html', 'DocumentFile', 'PDF']
+__all__ = ['read_pdf', 'read_img', 'read_html', 'DocumentFile', 'PDF', 'TIFF']
 
 
 AbstractPath = Union[str, Path]
 AbstractFile = Union[AbstractPath, bytes]
+ImageFile = Union[AbstractFile, np.ndarray]
 Bbox = Tuple[float, float, float, float]
+# Rendered pages are exchanged between processes through memory-backed files when available
+_BUFFER_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _format_img(
+    img: np.ndarray,
+    output_size: Optional[Tuple[int, int]] = None,
+    rgb_output: bool = True,
+    rgb_input: bool = False,
+) -> np.ndarray:
+    """Resize a decoded image and switch its channel order
+
+    Args:
+        img: image of shape H x W x 3 (or H x W and H x W x 1 for single-channel images)
+        output_size: the expected output size in format H x W
+        rgb_output: whether the output channel order should be RGB instead of BGR
+        rgb_input: whether the input channel order is RGB instead of BGR
+    Returns:
+        the formatted image of shape H x W x 3
+    """
+
+    # Resizing first, so that memory-mapped inputs are only read once
+    if isinstance(output_size, tuple):
+        img = cv2.resize(img, output_size[::-1], interpolation=cv2.INTER_LINEAR)
+    if img.ndim == 2 or img.shape[2] == 1:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB if rgb_output else cv2.COLOR_GRAY2BGR)
+    # Switch the channel order
+    if rgb_output != rgb_input:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
 
 
 def read_img(
-    file: AbstractFile,
+    file: ImageFile,
     output_size: Optional[Tuple[int, int]] = None,
     rgb_output: bool = True,
+    reduced_decoding: bool = False,
 ) -> np.ndarray:
     """Read an image file into numpy format
 
@@ -30,33 +71,91 @@ def read_img(
         >>> page = read_img("path/to/your/doc.jpg")
 
     Args:
-        file: the path to the image file
+        file: the path to the image file, a binary stream, or an uncompressed RGB (or single-channel) raster of
+            dtype uint8, such as a `np.memmap` (cf. `DocumentFile.from_raster`)
         output_size: the expected output size of each page in format H x W
         rgb_output: whether the output ndarray channel order should be RGB instead of BGR.
+        reduced_decoding: whether JPEG images should be decoded at a reduced resolution (1/2, 1/4 or 1/8) when it
+            still covers the output size, which is much faster than decoding them at full resolution
     Returns:
         the page decoded as numpy ndarray of shape H x W x 3
     """
 
+    img: Optional[np.ndarray] = None
+    if isinstance(file, np.ndarray):
+        if file.dtype != np.uint8 or file.ndim not in (2, 3) or (file.ndim == 3 and file.shape[2] not in (1, 3)):
+            raise ValueError("incorrect raster: expected a uint8 array of shape H x W, H x W x 1 or H x W x 3.")
+        return _format_img(file, output_size, rgb_output, rgb_input=True)
+
     if isinstance(file, (str, Path)):
         if not Path(file).is_file():
             raise FileNotFoundError(f"unable to access {file}")
-        img = cv2.imread(str(file), cv2.IMREAD_COLOR)
-    elif isinstance(file, bytes):
-        file = np.frombuffer(file, np.uint8)
-        img = cv2.imdecode(file, cv2.IMREAD_COLOR)
-    else:
+        if reduced_decoding and isinstance(output_size, tuple):
+            with open(file, 'rb') as f:
+                file = f.read()
+        else:
+            img = cv2.imread(str(file), cv2.IMREAD_COLOR)
+    elif not isinstance(file, bytes):
         raise TypeError("unsupported object type for argument 'file'")
 
+    if isinstance(file, bytes):
+        # JPEG can be decoded at a reduced scale
+        if reduced_decoding and isinstance(output_size, tuple) and file[:3] == b'\xff\xd8\xff':
+            img = _decode_reduced(file, output_size)
+        else:
+            img = cv2.imdecode(np.frombuffer(file, np.uint8), cv2.IMREAD_COLOR)
+
     # Validity check
     if img is None:
         raise ValueError("unable to read file.")
-    # Resizing
-    if isinstance(output_size, tuple):
-        img = cv2.resize(img, output_size[::-1], interpolation=cv2.INTER_LINEAR)
-    # Switch the channel order
-    if rgb_output:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    return img
+    return _format_img(img, output_size, rgb_output)
+
+
+_REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def _get_jpeg_shape(data: bytes) -> Optional[Tuple[int, int]]:
+    """Read the shape of a JPEG image from its frame header, without decoding it
+
+    Args:
+        data: the encoded image
+
+    Returns:
+        the image shape in format H x W, or None if no frame header was found
+    """
+
+    offset = 2
+    while offset + 9 < len(data) and data[offset] == 0xFF:
+        marker = data[offset + 1]
+        # Start of frame markers (excluding DHT, JPG & DAC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[offset + 5: offset + 7], 'big')
+            width = int.from_bytes(data[offset + 7: offset + 9], 'big')
+            return height, width
+        offset += 2 + int.from_bytes(data[offset + 2: offset + 4], 'big')
+
+    return None
+
+
+def _decode_reduced(data: bytes, output_size: Tuple[int, int]) -> Optional[np.ndarray]:
+    """Decode a JPEG image at the smallest reduced resolution (1/2, 1/4 or 1/8) that still covers the output size
+
+    Args:
+        data: the encoded image
+        output_size: the expected output size in format H x W
+
+    Returns:
+        the decoded image in BGR format, or None if it could not be decoded
+    """
+
+    stream = np.frombuffer(data, np.uint8)
+    shape = _get_jpeg_shape(data)
+    if shape is not None:
+        for factor in (8, 4, 2):
+            if all(math.ceil(size / factor) >= target for size, target in zip(shape, output_size)):
+                return cv2.imdecode(stream, _REDUCED_FLAGS[factor])
+
+    return cv2.imdecode(stream, cv2.IMREAD_COLOR)
 
 
 def read_pdf(file: AbstractFile, **kwargs: Any) -> fitz.Document:
@@ -88,11 +187,71 @@ def read_pdf(file: AbstractFile, **kwargs: Any) -> fitz.Document:
     return fitz.open(**fitz_args, filetype="pdf", **kwargs)
 
 
+def _get_transform(
+    page: fitz.fitz.Page,
+    output_size: Optional[Tuple[int, int]] = None,
+    default_scales: Tuple[float, float] = (2, 2),
+    target_size: Optional[Tuple[int, int]] = None,
+) -> fitz.Matrix:
+    """Get the transformation matrix used to render a page (cf. `convert_page_to_numpy`)"""
+
+    # If no output size is specified, keep the origin one
+    if output_size is not None:
+        scales = (output_size[1] / page.MediaBox[2], output_size[0] / page.MediaBox[3])
+    elif target_size is not None:
+        # Just enough resolution for the page to cover the target size, preserving its aspect ratio
+        scale = max(target_size[0] / page.MediaBox[3], target_size[1] / page.MediaBox[2])
+        scales = (scale, scale)
+    else:
+        # Default 72 DPI (scales of (1, 1)) is unnecessarily low
+        scales = default_scales
+
+    return fitz.Matrix(*scales)
+
+
+def get_page_shape(
+    page: fitz.fitz.Page,
+    output_size: Optional[Tuple[int, int]] = None,
+    default_scales: Tuple[float, float] = (2, 2),
+    target_size: Optional[Tuple[int, int]] = None,
+) -> Tuple[int, int]:
+    """Get the shape of a page once rendered by `convert_page_to_numpy`, without rendering it
+
+    Args:
+        page: the page of a file read with PyMuPDF
+        output_size: the expected output size of the page in format H x W
+        default_scales: spatial scaling to be applied when neither output_size nor target_size is specified
+        target_size: size in format H x W that the page should cover, the scale being adapted to the page
+
+    Returns:
+        the shape of the rendered page in format H x W
+    """
+
+    rect = (page.rect * _get_transform(page, output_size, default_scales, target_size)).irect
+    return rect.height, rect.width
+
+
+def _pixmap_to_numpy(pixmap: fitz.Pixmap) -> np.ndarray:
+    """Copy the raw samples (RGB or gray) of a pixel map without encoding them, into a writable array
+
+    Args:
+        pixmap: the pixel map, without alpha channel
+
+    Returns:
+        the samples as numpy ndarray of shape H x W x C
+    """
+
+    samples = pixmap.samples_mv if hasattr(pixmap, 'samples_mv') else pixmap.samples
+    return np.frombuffer(bytearray(samples), dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+
+
 def convert_page_to_numpy(
     page: fitz.fitz.Page,
     output_size: Optional[Tuple[int, int]] = None,
     rgb_output: bool = True,
     default_scales: Tuple[float, float] = (2, 2),
+    grayscale: bool = False,
+    target_size: Optional[Tuple[int, int]] = None,
 ) -> np.ndarray:
     """Convert a fitz page to a numpy-formatted image
 
@@ -101,30 +260,25 @@ def convert_page_to_numpy(
         output_size: the expected output size of each page in format H x W. Default goes to 840 x 595 for A4 pdf,
         if you want to increase the resolution while preserving the original A4 aspect ratio can pass (1024, 726)
         rgb_output: whether the output ndarray channel order should be RGB instead of BGR.
-        default_scales: spatial scaling to be applied when output_size is not specified where (1, 1)
-            corresponds to 72 dpi rendering.
+        default_scales: spatial scaling to be applied when neither output_size nor target_size is specified where
+            (1, 1) corresponds to 72 dpi rendering.
+        grayscale: whether the page should be rendered in grayscale, in which case the output has a single channel
+        target_size: size in format H x W that the rendered page should cover while preserving its aspect ratio
+            (e.g. the input shape of the detection model): the scale is then adapted to the size of each page
 
     Returns:
         the rendered image in numpy format
     """
 
-    # If no output size is specified, keep the origin one
-    if output_size is not None:
-        scales = (output_size[1] / page.MediaBox[2], output_size[0] / page.MediaBox[3])
-    else:
-        # Default 72 DPI (scales of (1, 1)) is unnecessarily low
-        scales = default_scales
-
-    transform_matrix = fitz.Matrix(*scales)
+    transform_matrix = _get_transform(page, output_size, default_scales, target_size)
 
-    # Generate the pixel map using the transformation matrix
-    stream = page.getPixmap(matrix=transform_matrix).getImageData()
-    # Decode it into a numpy
-    img = cv2.imdecode(np.frombuffer(stream, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    # Generate the pixel map using the transformation matrix, without alpha channel
+    pixmap = page.getPixmap(matrix=transform_matrix, colorspace=fitz.csGRAY if grayscale else fitz.csRGB, alpha=False)
+    img = _pixmap_to_numpy(pixmap)
 
     # Switch the channel order
-    if rgb_output:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    if not rgb_output and not grayscale:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
 
     return img
 
@@ -145,14 +299,143 @@ def read_html(url: str, **kwargs: Any) -> bytes:
     return HTML(url, **kwargs).write_pdf()
 
 
+def _render_pages(
+    file: AbstractFile,
+    page_idxs: Sequence[int],
+    path: str,
+    kwargs: Dict[str, Any],
+    read_kwargs: Dict[str, Any],
+) -> List[Tuple[int, ...]]:
+    """Render pages of a PDF file into a raw buffer file, using a dedicated document handle (process pool worker)
+
+    Args:
+        file: the path to the PDF file or a binary stream
+        page_idxs: indices of the pages to render
+        path: path of the buffer file, where the pages are written consecutively
+        kwargs: keyword arguments of `convert_page_to_numpy`
+        read_kwargs: keyword arguments of `read_pdf`
+
+    Returns:
+        the shape of each rendered page
+    """
+
+    doc = read_pdf(file, **read_kwargs)
+    shapes = []
+    with open(path, 'wb') as f:
+        for idx in page_idxs:
+            img = np.ascontiguousarray(convert_page_to_numpy(doc[idx], **kwargs))
+            f.write(img.data)
+            shapes.append(img.shape)
+
+    return shapes
+
+
+def _prefetch(items: Iterable[Any], size: int) -> Iterator[Any]:
+    """Consume an iterable in a background thread, keeping at most `size` items ahead of the caller
+
+    Args:
+        items: the iterable to consume
+        size: maximum number of items buffered
+
+    Returns:
+        iterator over the items, in the same order
+    """
+
+    queue: Queue = Queue(maxsize=size)
+    stop_event = Event()
+    sentinel = object()
+
+    def _put(item: Any) -> bool:
+        # Regularly check whether the caller stopped iterating
+        while not stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _worker() -> None:
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+        except Exception as e:
+            _put(e)
+        _put(sentinel)
+
+    Thread(target=_worker, daemon=True).start()
+    try:
+        while True:
+            item = queue.get()
+            if item is sentinel:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop_event.set()
+
+
 class PDF:
     """PDF document template
 
+    Pages can be rendered lazily: iterating over the document or indexing it (`doc[idx]`, `doc[start:stop]`)
+    only renders the requested pages.
+
     Args:
         doc: input PDF document
+        workers: number of processes rendering the pages in `as_images`, each of them with its own document handle
+        read_kwargs: keyword arguments of `read_pdf` used to open the document, passed on to the rendering processes
     """
-    def __init__(self, doc: fitz.Document) -> None:
+    def __init__(self, doc: fitz.Document, workers: int = 1, read_kwargs: Optional[Dict[str, Any]] = None) -> None:
         self.doc = doc
+        self.workers = workers
+        self.read_kwargs = read_kwargs if isinstance(read_kwargs, dict) else {}
+
+    def __len__(self) -> int:
+        return len(self.doc)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[np.ndarray, List[np.ndarray]]:
+        if isinstance(idx, slice):
+            return list(self.iter_images(range(*idx.indices(len(self.doc)))))
+        if idx < 0:
+            idx += len(self.doc)
+        if idx < 0 or idx >= len(self.doc):
+            raise IndexError("page index out of range")
+        return convert_page_to_numpy(self.doc[idx])
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.iter_images()
+
+    def iter_images(
+        self,
+        page_idxs: Optional[Iterable[int]] = None,
+        prefetch: int = 0,
+        **kwargs: Any,
+    ) -> Iterator[np.ndarray]:
+        """Lazily convert document pages to images, so that only the pages being processed are kept in memory
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> from doctr.models import ocr_predictor
+            >>> model = ocr_predictor(pretrained=True)
+            >>> doc = DocumentFile.from_pdf("path/to/your/doc.pdf")
+            >>> for page in model.stream(doc.iter_images(prefetch=2)):
+            ...     print(page.render())
+
+        Args:
+            page_idxs: indices of the pages to convert, defaults to all pages
+            prefetch: number of pages rendered ahead in a background thread, so that rendering overlaps with the
+                processing of the previous pages (the document should not be used by another thread meanwhile)
+            kwargs: keyword arguments of `convert_page_to_numpy`
+        Returns:
+            iterator over the pages decoded as numpy ndarray of shape H x W x 3
+        """
+        page_idxs = range(len(self.doc)) if page_idxs is None else page_idxs
+        pages = (convert_page_to_numpy(self.doc[idx], **kwargs) for idx in page_idxs)
+
+        return _prefetch(pages, prefetch) if prefetch > 0 else pages
 
     def as_images(self, **kwargs) -> List[np.ndarray]:
         """Convert all document pages to images
@@ -166,8 +449,85 @@ class PDF:
         Returns:
             the list of pages decoded as numpy ndarray of shape H x W x 3
         """
+        if self.workers > 1 and len(self.doc) > 1:
+            return self._render_parallel(**kwargs)
         return [convert_page_to_numpy(page, **kwargs) for page in self.doc]
 
+    def _render_parallel(self, **kwargs: Any) -> List[np.ndarray]:
+        """Render contiguous page ranges in a process pool. Each worker writes its pages into a buffer file that
+        is then read at once, so that pages are not pickled between processes.
+
+        Args:
+            kwargs: keyword arguments of `convert_page_to_numpy`
+        Returns:
+            the list of pages decoded as numpy ndarray of shape H x W x 3, in the document order
+        """
+        # Workers open their own handle on the same file, or on the same bytes
+        file = self.doc.name if self.doc.name else self.doc.write()
+        num_workers = min(self.workers, len(self.doc))
+        chunk_size = math.ceil(len(self.doc) / num_workers)
+        page_ranges = [range(start, min(start + chunk_size, len(self.doc)))
+                       for start in range(0, len(self.doc), chunk_size)]
+
+        pages = []
+        # Workers are spawned rather than forked: they need nothing from the parent, whose threads (e.g. from
+        # TensorFlow or OpenCV) could leave a forked child deadlocked
+        with TemporaryDirectory(dir=_BUFFER_DIR) as tmp_dir, mp.get_context('spawn').Pool(num_workers) as pool:
+            paths = [os.path.join(tmp_dir, f"pages_{idx}.raw") for idx in range(len(page_ranges))]
+            results = [
+                pool.apply_async(_render_pages, (file, page_range, path, kwargs, self.read_kwargs))
+                for page_range, path in zip(page_ranges, paths)
+            ]
+            for path, result in zip(paths, results):
+                shapes = result.get()
+                # Pages are copied out of the file, so that they remain valid once the directory is removed
+                buffer = np.fromfile(path, dtype=np.uint8)
+                offset = 0
+                for shape in shapes:
+                    size = int(np.prod(shape))
+                    pages.append(buffer[offset: offset + size].reshape(shape))
+                    offset += size
+
+        return pages
+
+    def get_page_crops(
+        self,
+        idx: int,
+        boxes: np.ndarray,
+        scale: float = 4.,
+    ) -> List[np.ndarray]:
+        """Render only some regions of a page, e.g. to crop words at a higher resolution than the page rendering
+        used to localize them
+
+        Example::
+            >>> import numpy as np
+            >>> from doctr.documents import DocumentFile
+            >>> doc = DocumentFile.from_pdf("path/to/your/doc.pdf")
+            >>> crops = doc.get_page_crops(0, np.array([[0.1, 0.1, 0.3, 0.15]], dtype=np.float32))
+
+        Args:
+            idx: index of the page
+            boxes: relative boxes of the regions to render, of shape (N, 4) in format (xmin, ymin, xmax, ymax)
+            scale: spatial scaling of the rendering, where 1 corresponds to 72 dpi rendering
+        Returns:
+            the list of rendered regions, as numpy ndarray of shape H x W x 3
+        """
+
+        page = self.doc[idx]
+        width, height = page.rect.width, page.rect.height
+        # Interpret the page content only once
+        display_list = page.getDisplayList()
+        transform_matrix = fitz.Matrix(scale, scale)
+        crops = []
+        for xmin, ymin, xmax, ymax in np.clip(boxes[:, :4], 0, 1).tolist():
+            # Regions of at least one pixel
+            clip = fitz.Rect(xmin * width, ymin * height, max(xmax * width, xmin * width + 1 / scale),
+                             max(ymax * height, ymin * height + 1 / scale))
+            pixmap = display_list.getPixmap(matrix=transform_matrix, colorspace=fitz.csRGB, alpha=False, clip=clip)
+            crops.append(_pixmap_to_numpy(pixmap))
+
+        return crops
+
     def get_page_words(self, idx, **kwargs) -> List[Tuple[Bbox, str]]:
         """Get the annotations for all words of a given page"""
 
@@ -188,6 +548,44 @@ class PDF:
         """
         return [self.get_page_words(idx, **kwargs) for idx in range(len(self.doc))]
 
+    def get_page_elements(
+        self,
+        idx: int,
+        output_size: Optional[Tuple[int, int]] = None,
+        default_scales: Tuple[float, float] = (2, 2),
+    ) -> Page:
+        """Build the element of a page from its embedded text layer, without rendering it
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> page = DocumentFile.from_pdf("path/to/your/doc.pdf").get_page_elements(0)
+
+        Args:
+            idx: index of the page
+            output_size: the output size used to compute the page dimensions (cf. `convert_page_to_numpy`)
+            default_scales: the scales used to compute the page dimensions (cf. `convert_page_to_numpy`)
+        Returns:
+            the page element, with words grouped into lines and blocks as laid out in the text layer
+        """
+
+        page = self.doc[idx]
+        width, height = page.rect.width, page.rect.height
+        # xmin, ymin, xmax, ymax, value, block_idx, line_idx, word_idx
+        lines: Dict[Tuple[int, int], List[Word]] = {}
+        for xmin, ymin, xmax, ymax, value, block_idx, line_idx, _ in page.getTextWords():
+            geometry = (
+                (min(max(xmin / width, 0.), 1.), min(max(ymin / height, 0.), 1.)),
+                (min(max(xmax / width, 0.), 1.), min(max(ymax / height, 0.), 1.)),
+            )
+            lines.setdefault((block_idx, line_idx), []).append(Word(value, 1., geometry))
+        blocks: Dict[int, List[Line]] = {}
+        for (block_idx, _), words in lines.items():
+            blocks.setdefault(block_idx, []).append(Line(words))
+
+        page_shape = get_page_shape(page, output_size, default_scales)
+
+        return Page([Block(_lines) for _lines in blocks.values()], idx, page_shape)
+
     def get_page_artefacts(self, idx) -> List[Tuple[float, float, float, float]]:
         return [tuple(self.doc[idx].getImageBbox(artefact)) for artefact in self.doc[idx].get_images(full=True)]
 
@@ -205,11 +603,127 @@ class PDF:
         return [self.get_page_artefacts(idx) for idx in range(len(self.doc))]
 
 
+class TIFF:
+    """Multi-page TIFF document template
+
+    Frames are decoded lazily: iterating over the document or indexing it (`doc[idx]`, `doc[start:stop]`) only
+    decodes the requested frames.
+
+    Args:
+        file: the path to the TIFF file or a binary stream
+    """
+    def __init__(self, file: AbstractFile) -> None:
+        if isinstance(file, bytes):
+            # OpenCV only decodes selected frames from files
+            self._tmp_dir = TemporaryDirectory(dir=_BUFFER_DIR)
+            path = os.path.join(self._tmp_dir.name, 'doc.tiff')
+            with open(path, 'wb') as f:
+                f.write(file)
+            file = path
+        elif isinstance(file, (str, Path)):
+            if not Path(file).is_file():
+                raise FileNotFoundError(f"unable to access {file}")
+        else:
+            raise TypeError("unsupported object type for argument 'file'")
+
+        self.path = str(file)
+        self._frames: Optional[List[np.ndarray]] = None
+        if hasattr(cv2, 'imcount'):
+            self._num_frames = cv2.imcount(self.path)
+        else:
+            self._num_frames = len(self._read_frames(0, 1 << 31))
+        if self._num_frames == 0:
+            raise ValueError("unable to read file.")
+
+    def _read_frames(self, start: int, count: int) -> List[np.ndarray]:
+        if hasattr(cv2, 'imcount'):
+            success, frames = cv2.imreadmulti(self.path, start, count, flags=cv2.IMREAD_COLOR)
+        else:
+            # Older OpenCV releases can only decode all the frames at once
+            if self._frames is None:
+                success, all_frames = cv2.imreadmulti(self.path, flags=cv2.IMREAD_COLOR)
+                self._frames = list(all_frames) if success else []
+            frames = self._frames[start: start + count]
+            success = len(frames) > 0
+        return list(frames) if success else []
+
+    def __len__(self) -> int:
+        return self._num_frames
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[np.ndarray, List[np.ndarray]]:
+        if isinstance(idx, slice):
+            return list(self.iter_images(range(*idx.indices(len(self)))))
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("page index out of range")
+        return self.get_frame(idx)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.iter_images()
+
+    def get_frame(self, idx: int, **kwargs: Any) -> np.ndarray:
+        """Decode a single frame
+
+        Args:
+            idx: index of the frame
+            kwargs: keyword arguments of `read_img` (`output_size` and `rgb_output`)
+        Returns:
+            the frame decoded as numpy ndarray of shape H x W x 3
+        """
+        frames = self._read_frames(idx, 1)
+        if len(frames) == 0:
+            raise ValueError(f"unable to decode frame {idx}.")
+        return _format_img(frames[0], **kwargs)
+
+    def iter_images(
+        self,
+        page_idxs: Optional[Iterable[int]] = None,
+        prefetch: int = 0,
+        **kwargs: Any,
+    ) -> Iterator[np.ndarray]:
+        """Lazily decode document frames, so that only the frames being processed are kept in memory
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> from doctr.models import ocr_predictor
+            >>> model = ocr_predictor(pretrained=True)
+            >>> doc = DocumentFile.from_tiff("path/to/your/fax.tiff")
+            >>> for page in model.stream(doc.iter_images(prefetch=2)):
+            ...     print(page.render())
+
+        Args:
+            page_idxs: indices of the frames to decode, defaults to all frames
+            prefetch: number of frames decoded ahead in a background thread
+            kwargs: keyword arguments of `read_img` (`output_size` and `rgb_output`)
+        Returns:
+            iterator over the frames decoded as numpy ndarray of shape H x W x 3
+        """
+        page_idxs = range(len(self)) if page_idxs is None else page_idxs
+        pages = (self.get_frame(idx, **kwargs) for idx in page_idxs)
+
+        return _prefetch(pages, prefetch) if prefetch > 0 else pages
+
+    def as_images(self, **kwargs: Any) -> List[np.ndarray]:
+        """Decode all document frames
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> pages = DocumentFile.from_tiff("path/to/your/fax.tiff").as_images()
+
+        Args:
+            kwargs: keyword arguments of `read_img` (`output_size` and `rgb_output`)
+        Returns:
+            the list of frames decoded as numpy ndarray of shape H x W x 3
+        """
+        return list(self.iter_images(**kwargs))
+
+
 class DocumentFile:
     """Read a document from multiple extensions"""
 
     @classmethod
-    def from_pdf(cls, file: AbstractFile, **kwargs) -> PDF:
+    def from_pdf(cls, file: AbstractFile, workers: int = 1, **kwargs) -> PDF:
         """Read a PDF file
 
         Example::
@@ -218,13 +732,14 @@ class DocumentFile:
 
         Args:
             file: the path to the PDF file or a binary stream
+            workers: number of processes rendering the pages when converting the document to images
         Returns:
             a PDF document
         """
 
         doc = read_pdf(file, **kwargs)
 
-        return PDF(doc)
+        return PDF(doc, workers, kwargs)
 
     @classmethod
     def from_url(cls, url: str, **kwargs) -> PDF:
@@ -243,7 +758,55 @@ class DocumentFile:
         return cls.from_pdf(pdf_stream, **kwargs)
 
     @classmethod
-    def from_images(cls, files: Union[Sequence[AbstractFile], AbstractFile], **kwargs) -> List[np.ndarray]:
+    def from_tiff(cls, file: AbstractFile) -> TIFF:
+        """Read a multi-page TIFF file, whose frames are decoded lazily
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> doc = DocumentFile.from_tiff("path/to/your/fax.tiff")
+
+        Args:
+            file: the path to the TIFF file or a binary stream
+        Returns:
+            a TIFF document
+        """
+        return TIFF(file)
+
+    @classmethod
+    def from_raster(
+        cls,
+        file: AbstractPath,
+        shape: Tuple[int, ...],
+        offset: int = 0,
+    ) -> np.memmap:
+        """Map an uncompressed raster file (8-bit RGB or single-channel pixels, row by row) into memory, so that
+        it is paged in by the OS when it is read rather than being fully loaded
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> raster = DocumentFile.from_raster("path/to/your/scan.raw", (14000, 10000, 3))
+            >>> pages = DocumentFile.from_images(raster, output_size=(1024, 1024))
+
+        Args:
+            file: the path to the raster file
+            shape: the shape of the raster in format H x W x C (or H x W for single-channel rasters)
+            offset: the size of the file header to skip, in bytes
+        Returns:
+            a read-only memory map of the raster
+        """
+        if not Path(file).is_file():
+            raise FileNotFoundError(f"unable to access {file}")
+        if len(shape) not in (2, 3) or (len(shape) == 3 and shape[2] not in (1, 3)):
+            raise ValueError("incorrect raster shape: expected H x W, H x W x 1 or H x W x 3.")
+        return np.memmap(file, dtype=np.uint8, mode='r', offset=offset, shape=shape)
+
+    @classmethod
+    def from_images(
+        cls,
+        files: Union[Sequence[ImageFile], ImageFile],
+        workers: int = 1,
+        **kwargs: Any,
+    ) -> List[np.ndarray]:
         """Read an image file (or a collection of image files) and convert it into an image in numpy format
 
         Example::
@@ -251,11 +814,58 @@ class DocumentFile:
             >>> pages = DocumentFile.from_images(["path/to/your/page1.png", "path/to/your/page2.png"])
 
         Args:
-            files: the path to the image file or a binary stream, or a collection of those
+            files: the path to the image file, a binary stream or a raster (cf. `read_img`), or a collection of those
+            workers: number of threads decoding the images concurrently
+            kwargs: keyword arguments of `read_img`
         Returns:
             the list of pages decoded as numpy ndarray of shape H x W x 3
         """
-        if isinstance(files, (str, Path, bytes)):
+        if isinstance(files, (str, Path, bytes, np.ndarray)):
             files = [files]
 
-        return [read_img(file, **kwargs) for file in files]
+        return list(cls.iter_images(files, workers, **kwargs))
+
+    @classmethod
+    def iter_images(
+        cls,
+        files: Iterable[ImageFile],
+        workers: int = 1,
+        **kwargs: Any,
+    ) -> Iterator[np.ndarray]:
+        """Lazily read a collection of image files, decoding them in a pool of threads. The number of pages
+        decoded ahead of the caller is bounded, so that large collections can be streamed.
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> from doctr.models import ocr_predictor
+            >>> model = ocr_predictor(pretrained=True)
+            >>> files = ["path/to/your/page1.jpg", "path/to/your/page2.jpg"]
+            >>> for page in model.stream(DocumentFile.iter_images(files, output_size=(1024, 1024))):
+            ...     print(page.render())
+
+        Args:
+            files: the paths to the image files, binary streams or rasters, which can be lazily generated
+            workers: number of threads decoding the images concurrently
+            kwargs: keyword arguments of `read_img`
+        Returns:
+            iterator over the pages decoded as numpy ndarray of shape H x W x 3, in the input order
+        """
+        # Single-thread
+        if workers < 2:
+            yield from (read_img(file, **kwargs) for file in files)
+            return
+
+        # OpenCV releases the GIL while decoding
+        pool = ThreadPool(workers)
+        try:
+            pending: Deque[AsyncResult] = deque()
+            for file in files:
+                pending.append(pool.apply_async(read_img, (file,), kwargs))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().get()
+            while len(pending) > 0:
+                yield pending.popleft().get()
+        finally:
+            # Let the pending decodings complete, even if the iterator was closed early
+            pool.close()
+            pool.join()
@@ -4,9 +4,13 @@
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
 import numpy as np
-from typing import List
+import tensorflow as tf
+from tensorflow import keras
+from typing import List, Dict, Tuple, Callable, Any
 
-__all__ = ['extract_crops']
+from .preprocessor import PreProcessor
+
+__all__ = ['extract_crops', 'extract_packed_crops']
 
 
 def extract_crops(img: np.ndarray, boxes: np.ndarray) -> List[np.ndarray]:
@@ -18,7 +22,7 @@ def extract_crops(img: np.ndarray, boxes: np.ndarray) -> List[np.ndarray]:
             coordinates (xmin, ymin, xmax, ymax)
 
     Returns:
-        list of cropped images
+        list of cropped images, as views of the input image
     """
 
     if boxes.shape[0] == 0:
@@ -35,3 +39,75 @@ def extract_crops(img: np.ndarray, boxes: np.ndarray) -> List[np.ndarray]:
         # Add last index
         _boxes[2:] += 1
     return [img[box[1]: box[3], box[0]: box[2]] for box in _boxes]
+
+
+def extract_packed_crops(
+    imgs: List[np.ndarray],
+    boxes: List[np.ndarray],
+    pre_processor: PreProcessor,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Crop the boxes of several images and resize them straight into a single contiguous buffer
+
+    Example::
+        >>> import numpy as np
+        >>> from doctr.models import extract_packed_crops, recognition_predictor
+        >>> model = recognition_predictor(pretrained=True, backend='opencv')
+        >>> page = (255 * np.random.rand(600, 800, 3)).astype(np.uint8)
+        >>> boxes = np.array([[0, 0, 0.5, 0.1], [0.5, 0.5, 0.75, 0.6]], dtype=np.float32)
+        >>> crops, offsets = extract_packed_crops([page], [boxes], model.pre_processor)
+        >>> out = model(crops)
+
+    Args:
+        imgs: list of input images
+        boxes: list of relative bounding boxes of shape (N, 4) for each image
+        pre_processor: the preprocessor whose `resize_into` method is used to resize the crops
+
+    Returns:
+        a tuple with the packed crops of shape (N, H, W, C), and the offsets of shape (len(imgs) + 1,) where the
+        crops of the i-th image are packed between offsets[i] and offsets[i + 1]
+    """
+
+    offsets = np.zeros(len(imgs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([_boxes.shape[0] for _boxes in boxes])
+    # Crops are views of the images: each of them is only copied once, when resized into the buffer
+    crops = [crop for img, _boxes in zip(imgs, boxes) for crop in extract_crops(img, _boxes)]
+    if len(crops) == 0:
+        return np.zeros((0, *pre_processor.output_size, 3), dtype=np.uint8), offsets
+
+    return pre_processor.pack_inputs(crops), offsets
+
+
+def compiled_forward(
+    model: keras.Model,
+    graphs: Dict[Tuple[int, ...], Callable[[tf.Tensor], Any]],
+    batch: tf.Tensor,
+    batch_size: int,
+) -> Any:
+    """Perform the inference forward pass of a model with a graph traced for a fixed input signature.
+    Incomplete batches are padded to the full batch size, so that a single graph is traced per sample shape.
+
+    Args:
+        model: the model to run
+        graphs: traced graphs indexed by input shape, updated in place
+        batch: input batch of shape (N, H, W, C), with N <= batch_size
+        batch_size: the full batch size
+
+    Returns:
+        the model output for the input batch
+    """
+
+    num_samples = batch.shape[0]
+    if num_samples < batch_size:
+        batch = tf.pad(batch, [[0, batch_size - num_samples]] + [[0, 0]] * (len(batch.shape) - 1))
+    shape = tuple(batch.shape)
+    if shape not in graphs:
+        graphs[shape] = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape, dtype=tf.float32)],
+        )
+    out = graphs[shape](batch)
+    # Remove the padding
+    if num_samples < batch_size:
+        out = tf.nest.map_structure(lambda t: t[:num_samples], out)
+
+    return out
@@ -5,24 +5,177 @@
 
 
 import numpy as np
+from queue import Queue, Empty, Full
+from threading import Thread, Event
 from scipy.cluster.hierarchy import fclusterdata
-from typing import List, Any, Tuple
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from functools import partial
+from typing import List, Any, Tuple, Iterable, Iterator, Callable, Union, Optional, Dict, Sequence
 from .detection import DetectionPredictor
-from .recognition import RecognitionPredictor
-from ._utils import extract_crops
+from .recognition import RecognitionPreProcessor, RecognitionPredictor, RecognitionScheduler
+from ._utils import extract_crops, extract_packed_crops
 from doctr.documents.elements import Word, Line, Block, Page, Document
+from doctr.documents.reader import PDF, convert_page_to_numpy, get_page_shape
 from doctr.utils.repr import NestedObject
-from doctr.utils.geometry import resolve_enclosing_bbox
 
 __all__ = ['OCRPredictor', 'DocumentBuilder']
 
 
+# Source of the word crops of a page: the page itself, or a callable cropping given relative boxes
+CropSource = Union[np.ndarray, Callable[[np.ndarray], List[np.ndarray]]]
+
+# Marks the end of a pipeline stage
+_SENTINEL = object()
+
+
+def _put(queue: Queue, item: Any, stop_event: Event) -> bool:
+    """Put an item in a bounded queue, giving up if the pipeline was stopped
+
+    Args:
+        queue: the destination queue
+        item: the object to put
+        stop_event: event signaling that the consumer is gone
+
+    Returns:
+        whether the item was actually put in the queue
+    """
+    while not stop_event.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _run_stage(
+    func: Callable[[Any], Iterable[Any]],
+    inputs: Iterable[Any],
+    out_queue: Queue,
+    stop_event: Event,
+) -> None:
+    """Feed the outputs of a pipeline stage to the next one, forwarding exceptions to the consumer
+
+    Args:
+        func: function mapping an input item to an iterable of output items
+        inputs: iterable of input items
+        out_queue: queue of the next stage
+        stop_event: event signaling that the consumer is gone
+    """
+    try:
+        for item in inputs:
+            for out in func(item):
+                if not _put(out_queue, out, stop_event):
+                    return
+    except Exception as e:
+        _put(out_queue, e, stop_event)
+        return
+    _put(out_queue, _SENTINEL, stop_event)
+
+
+def _consume(queue: Queue, stop_event: Event) -> Iterator[Any]:
+    """Iterate over the items of a pipeline stage until its end, re-raising the exceptions of the producer
+
+    Args:
+        queue: the queue to consume
+        stop_event: event signaling that the pipeline was stopped
+
+    Returns:
+        iterator over the queue items
+    """
+    while not stop_event.is_set():
+        try:
+            item = queue.get(timeout=0.1)
+        except Empty:
+            continue
+        if item is _SENTINEL:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def _consume_groups(
+    queue: Queue,
+    stop_event: Event,
+    item_size: Callable[[Any], int],
+    max_size: int,
+) -> Iterator[List[Any]]:
+    """Iterate over groups of items of a pipeline stage: the items already queued are gathered with the first
+    available one, until their cumulated size reaches a maximum
+
+    Args:
+        queue: the queue to consume
+        stop_event: event signaling that the pipeline was stopped
+        item_size: function returning the size of an item
+        max_size: cumulated size of the items above which a group is complete
+
+    Returns:
+        iterator over the groups of items
+    """
+    group: List[Any] = []
+    size = 0
+    while not stop_event.is_set():
+        try:
+            # Only wait for the first item of a group
+            item = queue.get(timeout=0.1) if len(group) == 0 else queue.get_nowait()
+        except Empty:
+            if len(group) > 0:
+                yield group
+                group, size = [], 0
+            continue
+        if item is _SENTINEL:
+            if len(group) > 0:
+                yield group
+            return
+        if isinstance(item, Exception):
+            raise item
+        group.append(item)
+        size += item_size(item)
+        if size >= max_size:
+            yield group
+            group, size = [], 0
+
+
+def _filter_image_boxes(boxes: np.ndarray, image_boxes: np.ndarray, word_boxes: np.ndarray) -> np.ndarray:
+    """Only keep the detected boxes that are located in embedded images, and that are not already covered by
+    the text layer of the page
+
+    Args:
+        boxes: detected boxes of shape (N, 5)
+        image_boxes: relative boxes of the embedded images, of shape (M, 4)
+        word_boxes: relative boxes of the words of the text layer, of shape (K, 4)
+
+    Returns:
+        the filtered boxes
+    """
+
+    centers = (boxes[:, :2] + boxes[:, 2:4]) / 2
+    in_image = np.any(
+        (centers[:, None, 0] >= image_boxes[None, :, 0]) & (centers[:, None, 0] <= image_boxes[None, :, 2])
+        & (centers[:, None, 1] >= image_boxes[None, :, 1]) & (centers[:, None, 1] <= image_boxes[None, :, 3]),
+        axis=1,
+    )
+    if word_boxes.shape[0] > 0:
+        # Intersection with the words of the text layer, relatively to the area of the detected box
+        left = np.maximum(boxes[:, None, :2], word_boxes[None, :, :2])
+        right = np.minimum(boxes[:, None, 2:4], word_boxes[None, :, 2:])
+        intersection = np.prod(np.clip(right - left, 0, None), axis=-1).sum(axis=1)
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        in_image &= intersection < 0.5 * areas
+
+    return boxes[in_image]
+
+
 class OCRPredictor(NestedObject):
-    """Implements an object able to localize and identify text elements in a set of documents
+    """Implements an object able to localize and identify text elements in a set of documents. The confidence of
+    each word is the product of its detection score and of its recognition confidence.
 
     Args:
         det_predictor: detection module
-        reco_predictor: recognition module
+        reco_predictor: recognition module, or a recognition scheduler shared with other predictors
     """
 
     _children_names: List[str] = ['det_predictor', 'reco_predictor', 'doc_builder']
@@ -30,35 +183,326 @@ class OCRPredictor(NestedObject):
     def __init__(
         self,
         det_predictor: DetectionPredictor,
-        reco_predictor: RecognitionPredictor,
+        reco_predictor: Union[RecognitionPredictor, RecognitionScheduler],
     ) -> None:
 
         self.det_predictor = det_predictor
         self.reco_predictor = reco_predictor
         self.doc_builder = DocumentBuilder()
 
+    def _packing_preprocessor(self) -> Optional[RecognitionPreProcessor]:
+        """Get the preprocessor of the recognition predictor if it can consume crops packed into a single buffer
+
+        Returns:
+            the recognition preprocessor, or None if crops should be passed as a list
+        """
+        pre_processor = getattr(self.reco_predictor, 'pre_processor', None)
+        if isinstance(pre_processor, RecognitionPreProcessor) and pre_processor.backend == 'opencv' and \
+                pre_processor.num_buckets == 1:
+            return pre_processor
+        return None
+
+    def _crop_pages(
+        self,
+        pages: List[np.ndarray],
+        boxes: List[np.ndarray],
+    ) -> Union[List[np.ndarray], np.ndarray]:
+        """Extract the crops of several pages
+
+        Args:
+            pages: list of pages
+            boxes: list of relative boxes for each page
+
+        Returns:
+            list of crops, or crops packed into a single buffer when the recognition preprocessor can consume it
+        """
+        pre_processor = self._packing_preprocessor()
+        if pre_processor is not None:
+            # Crops are resized straight into the input buffer of the recognition model
+            return extract_packed_crops(pages, [_boxes[:, :4] for _boxes in boxes], pre_processor)[0]
+        return [crop for page, _boxes in zip(pages, boxes) for crop in extract_crops(page, _boxes[:, :4])]
+
+    def _crop_sources(
+        self,
+        sources: Sequence[CropSource],
+        boxes: List[np.ndarray],
+    ) -> Union[List[np.ndarray], np.ndarray]:
+        """Extract the crops of several pages from their crop sources
+
+        Args:
+            sources: list of pages, or of callables returning the crops of a page given its relative boxes
+            boxes: list of relative boxes for each page
+
+        Returns:
+            list of crops, or crops packed into a single buffer when the recognition preprocessor can consume it
+        """
+        pages = [source for source in sources if isinstance(source, np.ndarray)]
+        if len(pages) == len(sources):
+            return self._crop_pages(pages, boxes)
+
+        crops: List[np.ndarray] = []
+        for source, _boxes in zip(sources, boxes):
+            if isinstance(source, np.ndarray):
+                crops.extend(extract_crops(source, _boxes[:, :4]))
+            else:
+                crops.extend(source(_boxes[:, :4]))
+        pre_processor = self._packing_preprocessor()
+        if pre_processor is not None and len(crops) > 0:
+            return pre_processor.pack_inputs(crops)
+        return crops
+
+    def _recognize_words(
+        self,
+        crops: Union[List[np.ndarray], np.ndarray],
+        boxes: List[np.ndarray],
+        **kwargs: Any,
+    ) -> Tuple[List[np.ndarray], List[str]]:
+        """Identify the character sequences of cropped words, and weight the scores of their boxes with the
+        recognition confidence
+
+        Args:
+            crops: crops of the words of all pages
+            boxes: list of localization predictions of shape (N, 5) for each page
+            kwargs: keyword arguments passed to the recognition model
+
+        Returns:
+            a tuple with the list of boxes with updated scores, and the list of character sequences of all words
+        """
+        char_sequences, confidences = self.reco_predictor.predict(crops, **kwargs)
+        crop_idx = 0
+        scored_boxes = []
+        for _boxes in boxes:
+            _boxes = _boxes.copy()
+            _boxes[:, 4] *= confidences[crop_idx: crop_idx + _boxes.shape[0]]
+            scored_boxes.append(_boxes)
+            crop_idx += _boxes.shape[0]
+
+        return scored_boxes, char_sequences
+
     def __call__(
         self,
         pages: List[np.ndarray],
+        crop_sources: Optional[Sequence[CropSource]] = None,
         **kwargs: Any,
     ) -> Document:
+        """Localize and identify text elements in pages
+
+        Example::
+            >>> import cv2
+            >>> import numpy as np
+            >>> from doctr.models import ocr_predictor
+            >>> model = ocr_predictor(pretrained=True)
+            >>> scan = (255 * np.random.rand(3508, 2480, 3)).astype(np.uint8)
+            >>> out = model([cv2.resize(scan, (724, 1024))], crop_sources=[scan])
+
+        Args:
+            pages: list of pages (np.ndarray of shape H x W x C)
+            crop_sources: if specified, the words localized in each page are cropped from its source rather than from
+                the page itself. A source is either a higher resolution version of the page, or a callable returning
+                the crops given the relative boxes of shape (N, 4), e.g. `partial(pdf.get_page_crops, idx)`
+            kwargs: keyword arguments passed to the detection and recognition models
+
+        Returns:
+            the document
+        """
 
         # Dimension check
         if any(page.ndim != 3 for page in pages):
             raise ValueError("incorrect input shape: all pages are expected to be multi-channel 2D images.")
+        if crop_sources is not None and len(crop_sources) != len(pages):
+            raise ValueError("the number of crop sources is expected to match the number of pages.")
 
         # Localize text elements
         boxes = self.det_predictor(pages, **kwargs)
         # Crop images
-        crops = [crop for page, _boxes in zip(pages, boxes) for crop in extract_crops(page, _boxes[:, :4])]
+        crops = self._crop_pages(pages, boxes) if crop_sources is None else self._crop_sources(crop_sources, boxes)
         # Identify character sequences
-        char_sequences = self.reco_predictor(crops, **kwargs)
+        boxes, char_sequences = self._recognize_words(crops, boxes, **kwargs)
 
         # Reorganize
         out = self.doc_builder(boxes, char_sequences, [tuple(page.shape[:2]) for page in pages])
 
         return out
 
+    def process_pdf(
+        self,
+        doc: PDF,
+        min_words: int = 1,
+        min_image_area: float = 0.01,
+        adaptive_scale: bool = True,
+        reco_scale: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Document:
+        """Analyze a PDF document, building the pages from their embedded text layer when it is reliable: only the
+        pages without usable text layer, and the embedded images of the other pages, are processed by the models.
+
+        Example::
+            >>> from doctr.documents import DocumentFile
+            >>> from doctr.models import ocr_predictor
+            >>> model = ocr_predictor(pretrained=True)
+            >>> out = model.process_pdf(DocumentFile.from_pdf("path/to/your/doc.pdf"))
+
+        Args:
+            doc: the PDF document
+            min_words: minimal number of embedded words for the text layer of a page to be used
+            min_image_area: minimal area of an embedded image, relatively to the page area, for the text it
+                contains to be recognized
+            adaptive_scale: whether the render scale of each page should be adapted to its size, so that it is
+                rendered with just enough resolution for the input shape of the detection model
+            reco_scale: if specified, the words to recognize are rendered a second time at this scale (only the regions
+                of the localized words), where 1 corresponds to 72 dpi rendering
+            kwargs: keyword arguments passed to the detection and recognition models
+
+        Returns:
+            the document
+        """
+
+        pages: List[Optional[Page]] = [None] * len(doc)
+        ocr_idxs: List[int] = []
+        image_boxes: Dict[int, np.ndarray] = {}
+        for idx in range(len(doc)):
+            words = doc.get_page_words(idx)
+            # Text layers with missing glyph mappings are unreliable
+            if len(words) < min_words or 2 * sum('\ufffd' in value for _, value in words) > len(words):
+                ocr_idxs.append(idx)
+                continue
+            pages[idx] = doc.get_page_elements(idx)
+            # Embedded images may still contain text
+            rect = doc.doc[idx].rect
+            scale = np.array([rect.width, rect.height] * 2)
+            _image_boxes = np.asarray(doc.get_page_artefacts(idx), dtype=np.float32).reshape(-1, 4)
+            _image_boxes = np.clip(_image_boxes / scale, 0, 1)
+            areas = (_image_boxes[:, 2] - _image_boxes[:, 0]) * (_image_boxes[:, 3] - _image_boxes[:, 1])
+            if np.any(areas >= min_image_area):
+                image_boxes[idx] = _image_boxes[areas >= min_image_area]
+                ocr_idxs.append(idx)
+
+        # Process the remaining pages by batches, to bound the memory footprint
+        batch_size = self.det_predictor.pre_processor.batch_size
+        target_size = self.det_predictor.pre_processor.output_size if adaptive_scale else None
+        for start_idx in range(0, len(ocr_idxs), batch_size):
+            idxs = ocr_idxs[start_idx: start_idx + batch_size]
+            imgs = [convert_page_to_numpy(doc.doc[idx], target_size=target_size) for idx in idxs]
+            boxes = self.det_predictor(imgs, **kwargs)
+            for _idx, idx in enumerate(idxs):
+                if idx in image_boxes:
+                    word_boxes = np.array([
+                        [*word.geometry[0], *word.geometry[1]]
+                        for block in pages[idx].blocks for line in block.lines for word in line.words  # type: ignore
+                    ], dtype=np.float32).reshape(-1, 4)
+                    boxes[_idx] = _filter_image_boxes(boxes[_idx], image_boxes[idx], word_boxes)
+            # Words are rendered at a higher resolution if specified
+            if isinstance(reco_scale, (int, float)):
+                crops = self._crop_sources([partial(doc.get_page_crops, idx, scale=reco_scale) for idx in idxs], boxes)
+            else:
+                crops = self._crop_pages(imgs, boxes)
+            boxes, char_sequences = self._recognize_words(crops, boxes, **kwargs)
+
+            crop_idx = 0
+            for idx, _boxes in zip(idxs, boxes):
+                # Same dimensions as the pages of `PDF.as_images`
+                page = self.doc_builder.build_page(
+                    _boxes, char_sequences[crop_idx: crop_idx + _boxes.shape[0]], idx, get_page_shape(doc.doc[idx])
+                )
+                crop_idx += _boxes.shape[0]
+                # Merge the recognized words with the text layer
+                text_page = pages[idx]
+                if isinstance(text_page, Page):
+                    page = Page(text_page.blocks + page.blocks, idx, text_page.dimensions)
+                pages[idx] = page
+
+        return Document(pages)  # type: ignore[arg-type]
+
+    def stream(
+        self,
+        pages: Iterable[np.ndarray],
+        queue_size: int = 2,
+        **kwargs: Any,
+    ) -> Iterator[Page]:
+        """Pipeline pages through detection, cropping and recognition, yielding each page as soon as it is ready
+
+        Detection, recognition and the document building run concurrently in separate threads, connected by
+        bounded queues, so that the memory footprint does not grow with the number of pages. The words of the pages
+        waiting for recognition are gathered, up to the recognition batch size, so that recognition batches are full.
+
+        Example::
+            >>> import numpy as np
+            >>> from doctr.models import ocr_predictor
+            >>> model = ocr_predictor(pretrained=True)
+            >>> input_pages = [(255 * np.random.rand(600, 800, 3)).astype(np.uint8) for _ in range(4)]
+            >>> for page in model.stream(input_pages):
+            ...     print(page.render())
+
+        Args:
+            pages: iterable of pages (np.ndarray of shape H x W x C), which can be lazily generated
+            queue_size: maximum number of detection batches buffered between two stages
+            kwargs: keyword arguments passed to the detection and recognition models
+
+        Returns:
+            iterator over the page elements, in the input order
+        """
+
+        def _batch_pages(_pages: Iterable[np.ndarray]) -> Iterator[List[np.ndarray]]:
+            batch: List[np.ndarray] = []
+            for page in _pages:
+                # Dimension check
+                if page.ndim != 3:
+                    raise ValueError("incorrect input shape: all pages are expected to be multi-channel 2D images.")
+                batch.append(page)
+                if len(batch) == self.det_predictor.pre_processor.batch_size:
+                    yield batch
+                    batch = []
+            if len(batch) > 0:
+                yield batch
+
+        def _detect(batch: List[np.ndarray]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+            yield from zip(batch, self.det_predictor(batch, **kwargs))
+
+        def _recognize(
+            items: List[Tuple[np.ndarray, np.ndarray]],
+        ) -> Iterator[Tuple[np.ndarray, List[str], Tuple[int, int]]]:
+            pages, boxes = zip(*items)
+            # Only the crops and the page shapes are kept, so that the pages can be released
+            boxes, char_sequences = self._recognize_words(
+                self._crop_pages(list(pages), list(boxes)), list(boxes), **kwargs
+            )
+            crop_idx = 0
+            for page, _boxes in zip(pages, boxes):
+                yield _boxes, char_sequences[crop_idx: crop_idx + _boxes.shape[0]], tuple(page.shape[:2])
+                crop_idx += _boxes.shape[0]
+
+        # The crops of the pages already detected are recognized together, to fill the recognition batches
+        if isinstance(self.reco_predictor, RecognitionScheduler):
+            reco_batch_size = self.reco_predictor.batch_size
+        else:
+            reco_batch_size = self.reco_predictor.pre_processor.batch_size
+
+        stop_event = Event()
+        det_queue: Queue = Queue(maxsize=queue_size * self.det_predictor.pre_processor.batch_size)
+        reco_queue: Queue = Queue(maxsize=queue_size * self.det_predictor.pre_processor.batch_size)
+        workers = [
+            Thread(target=_run_stage, args=(_detect, _batch_pages(pages), det_queue, stop_event), daemon=True),
+            Thread(
+                target=_run_stage,
+                args=(
+                    _recognize,
+                    _consume_groups(det_queue, stop_event, lambda item: item[1].shape[0], reco_batch_size),
+                    reco_queue,
+                    stop_event,
+                ),
+                daemon=True,
+            ),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for page_idx, (boxes, char_sequences, page_shape) in enumerate(_consume(reco_queue, stop_event)):
+                yield self.doc_builder.build_page(boxes, char_sequences, page_idx, page_shape)
+        finally:
+            # Release the workers if the generator is closed early
+            stop_event.set()
+
 
 class DocumentBuilder(NestedObject):
     """Implements a document builder
@@ -67,13 +511,17 @@ class DocumentBuilder(NestedObject):
         resolve_lines: whether words should be automatically grouped into lines
         resolve_blocks: whether lines should be automatically grouped into blocks
         paragraph_break: relative length of the minimum space separating paragraphs
+        block_clustering: engine grouping lines into blocks, either 'hierarchical' (single-linkage clustering of
+            all the lines) or 'spatial' (connected components of the neighborhood graph of the lines, built with a
+            KD-tree), which yields the same blocks without computing all pairwise distances
     """
 
     def __init__(
         self,
         resolve_lines: bool = False,
         resolve_blocks: bool = False,
-        paragraph_break: float = 0.035
+        paragraph_break: float = 0.035,
+        block_clustering: str = 'hierarchical',
     ) -> None:
 
         self.resolve_lines = resolve_lines
@@ -82,6 +530,10 @@ class DocumentBuilder(NestedObject):
 
         self.paragraph_break = paragraph_break
 
+        if block_clustering not in ('hierarchical', 'spatial'):
+            raise ValueError(f"unsupported block clustering engine: {block_clustering}")
+        self.block_clustering = block_clustering
+
     @staticmethod
     def _sort_boxes(boxes: np.ndarray) -> np.ndarray:
         """Sort bounding boxes from top to bottom, left to right
@@ -94,40 +546,62 @@ class DocumentBuilder(NestedObject):
         """
         return (boxes[:, 0] + 2 * boxes[:, 3] / np.median(boxes[:, 3] - boxes[:, 1])).argsort()
 
-    def _resolve_sub_lines(self, boxes: np.ndarray, words: List[int]) -> List[List[int]]:
-        """Split a line in sub_lines
+    @staticmethod
+    def _line_starts(y_centers: np.ndarray, max_offset: float) -> np.ndarray:
+        """Find the first word of each line, i.e. the words whose vertical center is too far from the mean vertical
+        center of the words preceding them in the current line
 
         Args:
-            boxes: bounding boxes of shape (N, 4)
-            words: list of indexes for the words of the line
+            y_centers: vertical centers of the words sorted in reading order, of shape (N,)
+            max_offset: maximum distance between the center of a word and the mean center of its line
 
         Returns:
-            A list of (sub-)lines computed from the original line (words)
+            the indices of the first word of each line
         """
-        lines = []
-        # Sort words horizontally
-        words = [words[j] for j in np.argsort([boxes[i, 0] for i in words]).tolist()]
-        # Eventually split line horizontally
-        if len(words) < 2:
-            lines.append(words)
-        else:
-            sub_line = [words[0]]
-            for i in words[1:]:
-                horiz_break = True
+        line_starts = [0]
+        start, window = 0, 16
+        while True:
+            stop = min(start + window, y_centers.shape[0])
+            # Running mean of the line centers, as if all the words of the window belonged to the current line
+            mean_centers = np.cumsum(y_centers[start: stop - 1]) / np.arange(1, stop - start, dtype=y_centers.dtype)
+            is_break = ~(np.abs(y_centers[start + 1: stop] - mean_centers) < max_offset)
+            if is_break.any():
+                line_length = 1 + int(is_break.argmax())
+                start += line_length
+                line_starts.append(start)
+                window = max(16, 2 * line_length)
+            elif stop < y_centers.shape[0]:
+                # The line goes beyond the window
+                window *= 2
+            else:
+                break
+
+        return np.asarray(line_starts)
 
-                prev_box = boxes[sub_line[-1]]
-                # If distance between boxes is lower than paragraph break, same sub-line
-                if (boxes[i, 0] - prev_box[2]) < self.paragraph_break:
-                    horiz_break = False
+    def _resolve_sub_lines(self, boxes: np.ndarray, idxs: np.ndarray, line_starts: np.ndarray) -> List[List[int]]:
+        """Split lines in sub_lines
+
+        Args:
+            boxes: bounding boxes of shape (N, 4)
+            idxs: indices of the boxes, grouped by line
+            line_starts: position in idxs of the first word of each line
 
-                if horiz_break:
-                    lines.append(sub_line)
-                    sub_line = []
+        Returns:
+            A list of (sub-)lines computed from the original lines
+        """
+        line_ids = np.zeros(idxs.shape[0], dtype=np.int64)
+        line_ids[line_starts[1:]] = 1
+        line_ids = np.cumsum(line_ids)
+        # Sort words horizontally within each line
+        idxs = idxs[np.lexsort((boxes[idxs, 0], line_ids))]
+        # Eventually split lines horizontally: if distance between boxes is lower than paragraph break, same sub-line
+        is_break = np.diff(line_ids) != 0
+        is_break |= ~(boxes[idxs[1:], 0] - boxes[idxs[:-1], 2] < self.paragraph_break)
 
-                sub_line.append(i)
-            lines.append(sub_line)
+        bounds = [0, *(np.flatnonzero(is_break) + 1).tolist(), idxs.shape[0]]
+        _idxs = idxs.tolist()
 
-        return lines
+        return [_idxs[start: stop] for start, stop in zip(bounds[:-1], bounds[1:])]
 
     def _resolve_lines(self, boxes: np.ndarray) -> List[List[int]]:
         """Order boxes to group them in lines
@@ -142,34 +616,30 @@ class DocumentBuilder(NestedObject):
         y_med = np.median(boxes[:, 3] - boxes[:, 1])
         # Sort boxes
         idxs = (boxes[:, 0] + 2 * boxes[:, 3] / y_med).argsort()
+        # If y-center of the box is close enough to mean y-center of the line, same line
+        line_starts = self._line_starts(boxes[idxs][:, [1, 3]].mean(axis=1), y_med / 2)
 
-        lines = []
-        words = [idxs[0]]  # Assign the top-left word to the first line
-        # Define a mean y-center for the line
-        y_center_sum = boxes[idxs[0]][[1, 3]].mean()
-
-        for idx in idxs[1:]:
-            vert_break = True
+        # Compute sub-lines (horizontal split)
+        return self._resolve_sub_lines(boxes, idxs, line_starts)
 
-            # If y-center of the box is close enough to mean y-center of the line, same line
-            if abs(boxes[idx][[1, 3]].mean() - y_center_sum / len(words)) < y_med / 2:
-                vert_break = False
-
-            if vert_break:
-                # Compute sub-lines (horizontal split)
-                lines.extend(self._resolve_sub_lines(boxes, words))
-                words = []
-                y_center_sum = 0
-
-            words.append(idx)
-            y_center_sum += boxes[idx][[1, 3]].mean()
+    @staticmethod
+    def _connected_clusters(features: np.ndarray, max_dist: float) -> np.ndarray:
+        """Cluster points as the connected components of the graph linking the points closer than a distance, which
+        matches the flat clusters of single-linkage clustering cut at this distance
 
-        # Use the remaining words to form the last(s) line(s)
-        if len(words) > 0:
-            # Compute sub-lines (horizontal split)
-            lines.extend(self._resolve_sub_lines(boxes, words))
+        Args:
+            features: coordinates of the points, of shape (N, D)
+            max_dist: maximum euclidean distance between two neighbors
 
-        return lines
+        Returns:
+            cluster index of each point, of shape (N,)
+        """
+        pairs = cKDTree(features).query_pairs(max_dist, output_type='ndarray')
+        graph = coo_matrix(
+            (np.ones(pairs.shape[0], dtype=bool), (pairs[:, 0], pairs[:, 1])),
+            shape=(features.shape[0], features.shape[0]),
+        )
+        return connected_components(graph, directed=False)[1]
 
     def _resolve_blocks(self, boxes: np.ndarray, lines: List[List[int]]) -> List[List[List[int]]]:
         """Order lines to group them in blocks
@@ -182,13 +652,14 @@ class DocumentBuilder(NestedObject):
             nested list of box indices
         """
         # Resolve enclosing boxes of lines
-        _lines = [
-            [
-                ((boxes[idx, 0], boxes[idx, 1]), (boxes[idx, 2], boxes[idx, 3])) for idx in line
-            ] for line in lines
-        ]
-        _box_lines = [resolve_enclosing_bbox(line) for line in _lines]
-        box_lines = np.asarray([(x1, y1, x2, y2) for ((x1, y1), (x2, y2)) in _box_lines])
+        line_boxes = boxes[np.concatenate(lines)]
+        line_starts = np.cumsum([0] + [len(line) for line in lines[:-1]])
+        box_lines = np.concatenate(
+            (
+                np.minimum.reduceat(np.minimum(line_boxes[:, :2], line_boxes[:, 2:4]), line_starts),
+                np.maximum.reduceat(np.maximum(line_boxes[:, :2], line_boxes[:, 2:4]), line_starts),
+            ), axis=1
+        )
 
         # Compute geometrical features of lines to clusterize
         # Clusterizing only with box centers yield to poor results for complex documents
@@ -207,7 +678,10 @@ class DocumentBuilder(NestedObject):
             ), axis=-1
         )
         # Compute clusters
-        clusters = fclusterdata(box_features, t=0.1, depth=4, criterion='distance', metric='euclidean')
+        if self.block_clustering == 'spatial':
+            clusters = self._connected_clusters(box_features, 0.1)
+        else:
+            clusters = fclusterdata(box_features, t=0.1, depth=4, criterion='distance', metric='euclidean')
 
         _blocks = dict()
         # Form clusters
@@ -266,6 +740,26 @@ class DocumentBuilder(NestedObject):
 
         return blocks
 
+    def build_page(
+        self,
+        boxes: np.ndarray,
+        char_sequences: List[str],
+        page_idx: int,
+        page_shape: Tuple[int, int],
+    ) -> Page:
+        """Re-arrange the detected words of a single page into structured blocks
+
+        Args:
+            boxes: localization predictions of the page words, of shape (N, 5)
+            char_sequences: list of the page word values, of size N
+            page_idx: index of the page in the document
+            page_shape: shape of the page
+
+        Returns:
+            page element
+        """
+        return Page(self._build_blocks(boxes, char_sequences), page_idx, page_shape)
+
     def extra_repr(self) -> str:
         return (f"resolve_lines={self.resolve_lines}, resolve_blocks={self.resolve_blocks}, "
                 f"paragraph_break={self.paragraph_break}")
@@ -293,11 +787,9 @@ class DocumentBuilder(NestedObject):
         for page_boxes in boxes:
             # Assemble all detected words into structured blocks
             _pages.append(
-                Page(
-                    self._build_blocks(
-                        page_boxes,
-                        char_sequences[crop_idx: crop_idx + page_boxes.shape[0]]
-                    ),
+                self.build_page(
+                    page_boxes,
+                    char_sequences[crop_idx: crop_idx + page_boxes.shape[0]],
                     page_idx,
                     page_shapes[page_idx],
                 )
@@ -3,13 +3,16 @@
 # This program is licensed under the Apache License version 2.
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
+import math
 import tensorflow as tf
 from tensorflow import keras
 import numpy as np
 import cv2
 from typing import Union, List, Tuple, Any, Optional, Dict
-from ..preprocessor import PreProcessor
+from ..preprocessor import PreProcessor, CV2_INTERPOLATIONS
+from .._utils import compiled_forward
 from doctr.utils.repr import NestedObject
+from doctr.datasets.multithreading import multithread_exec
 
 __all__ = ['DetectionPreProcessor', 'DetectionModel', 'DetectionPostProcessor', 'DetectionPredictor']
 
@@ -29,6 +32,11 @@ class DetectionPreProcessor(PreProcessor):
         mean: mean value of the training distribution by channel
         std: standard deviation of the training distribution by channel
         interpolation: one of 'bilinear', 'nearest', 'bicubic', 'area', 'lanczos3', 'lanczos5'
+        backend: 'tensorflow' or 'opencv' (batched resizing with multiple threads)
+        preserve_aspect_ratio: whether pages should be resized preserving their aspect ratio, and padded to the
+            right and to the bottom
+        pad_multiple: if specified along with `preserve_aspect_ratio`, batches are only padded to the smallest
+            multiple of this value that fits their pages, rather than to the output size
 
     """
 
@@ -38,10 +46,30 @@ class DetectionPreProcessor(PreProcessor):
         batch_size: int = 1,
         mean: Tuple[float, float, float] = (.5, .5, .5),
         std: Tuple[float, float, float] = (1., 1., 1.),
-        interpolation: str = 'bilinear'
+        interpolation: str = 'bilinear',
+        backend: str = 'tensorflow',
+        preserve_aspect_ratio: bool = False,
+        pad_multiple: Optional[int] = None,
     ) -> None:
 
-        super().__init__(output_size, batch_size, mean, std, interpolation)
+        super().__init__(output_size, batch_size, mean, std, interpolation, backend)
+        self.preserve_aspect_ratio = preserve_aspect_ratio
+        self.pad_multiple = pad_multiple
+
+    def get_resized_shape(self, page_shape: Tuple[int, int]) -> Tuple[int, int]:
+        """Compute the shape of a page once resized to fit the output size while preserving its aspect ratio
+
+        Args:
+            page_shape: shape of the page in format (H, W)
+
+        Returns:
+            the resized shape in format (H, W)
+        """
+        scale = min(self.output_size[0] / page_shape[0], self.output_size[1] / page_shape[1])
+        return (
+            min(self.output_size[0], max(1, round(scale * page_shape[0]))),
+            min(self.output_size[1], max(1, round(scale * page_shape[1]))),
+        )
 
     def resize(
         self,
@@ -56,8 +84,68 @@ class DetectionPreProcessor(PreProcessor):
             the processed image after being resized
         """
 
+        if self.preserve_aspect_ratio:
+            resized = tf.image.resize(x, self.get_resized_shape(x.shape[:2]), method=self.interpolation)
+            return tf.image.pad_to_bounding_box(resized, 0, 0, *self.output_size)
+
         return tf.image.resize(x, self.output_size, method=self.interpolation)
 
+    def resize_into(
+        self,
+        x: np.ndarray,
+        out: np.ndarray,
+    ) -> None:
+        """Resize images using OpenCV backend.
+
+        Args:
+            x: image as a np.ndarray
+            out: zero-initialized destination of shape (H, W, C)
+        """
+
+        if self.preserve_aspect_ratio:
+            height, width = self.get_resized_shape(x.shape[:2])
+            out[:height, :width] = cv2.resize(x, (width, height), interpolation=CV2_INTERPOLATIONS[self.interpolation])
+        else:
+            out[...] = cv2.resize(x, out.shape[1::-1], interpolation=CV2_INTERPOLATIONS[self.interpolation])
+
+    def letterbox_inputs(
+        self,
+        x: List[np.ndarray],
+    ) -> Tuple[List[tf.Tensor], List[np.ndarray]]:
+        """Resize pages preserving their aspect ratio, pad them and gather them into batches
+
+        Args:
+            x: list of pages (np.ndarray)
+
+        Returns:
+            a tuple with the list of normalized batches, and for each batch, the fraction of the padded input
+            covered by each page in format (H, W), of shape (N, 2)
+        """
+
+        processed_batches, valid_ratios = [], []
+        for idx in range(0, len(x), self.batch_size):
+            samples = x[idx: idx + self.batch_size]
+            resized_shapes = np.asarray([self.get_resized_shape(sample.shape[:2]) for sample in samples])
+            padded_shape = self.output_size
+            if isinstance(self.pad_multiple, int):
+                # Pad the batch to the smallest multiple of pad_multiple that fits all its pages
+                height, width = (
+                    min(int(self.pad_multiple * math.ceil(size / self.pad_multiple)), max_size)
+                    for size, max_size in zip(resized_shapes.max(axis=0), self.output_size)
+                )
+                padded_shape = (height, width)
+            if self.backend == 'opencv':
+                batch = self.pack_inputs(samples, padded_shape)
+            else:
+                batch = tf.stack([
+                    self.resize(tf.cast(sample, dtype=tf.float32))[:padded_shape[0], :padded_shape[1]]
+                    for sample in samples
+                ], axis=0)
+            processed_batches.append(self.normalize(batch))
+            valid_ratios.append(resized_shapes / np.asarray(padded_shape))
+
+        return processed_batches, valid_ratios
+
 
 class DetectionModel(keras.Model, NestedObject):
     """Implements abstract DetectionModel class"""
@@ -81,16 +169,19 @@ class DetectionPostProcessor(NestedObject):
         min_size_box (int): minimal length (pix) to keep a box
         max_candidates (int): maximum boxes to consider in a single page
         box_thresh (float): minimal objectness score to consider a box
+        workers (int): number of threads processing the pages of a batch concurrently
     """
 
     def __init__(
         self,
         box_thresh: float = 0.5,
-        bin_thresh: float = 0.5
+        bin_thresh: float = 0.5,
+        workers: Optional[int] = 1,
     ) -> None:
 
         self.box_thresh = box_thresh
         self.bin_thresh = bin_thresh
+        self.workers = workers
 
     def extra_repr(self) -> str:
         return f"box_thresh={self.box_thresh}, max_candidates={self.max_candidates}"
@@ -120,17 +211,20 @@ class DetectionPostProcessor(NestedObject):
         self,
         pred: np.ndarray,
         bitmap: np.ndarray,
-    ) -> List[List[float]]:
+    ) -> np.ndarray:
         raise NotImplementedError
 
     def __call__(
         self,
         x: Dict[str, tf.Tensor],
+        valid_ratios: Optional[np.ndarray] = None,
     ) -> List[np.ndarray]:
         """Performs postprocessing for a list of model outputs
 
         Args:
             x: dictionary of the model output
+            valid_ratios: fraction of the padded input covered by each page in format (H, W), of shape (N, 2), used to
+                map the boxes back to relative coordinates of the pages (cf. `DetectionPreProcessor.letterbox_inputs`)
 
         returns:
             list of N tensors (for each input sample), with each tensor of shape (*, 5).
@@ -139,21 +233,25 @@ class DetectionPostProcessor(NestedObject):
         p = tf.squeeze(p, axis=-1)  # remove last dim
         bitmap = tf.cast(p > self.bin_thresh, tf.float32)
 
-        p = tf.unstack(p, axis=0)
-        bitmap = tf.unstack(bitmap, axis=0)
+        p = p.numpy()
+        bitmap = bitmap.numpy()
 
-        boxes_batch = []
         # Kernel for opening, empirical law for ksize
-        k_size = 1 + int(p[0].shape[0] / 512)
+        k_size = 1 + int(p.shape[1] / 512)
         kernel = np.ones((k_size, k_size), np.uint8)
 
-        for p_, bitmap_ in zip(p, bitmap):
-            p_ = p_.numpy()
-            bitmap_ = bitmap_.numpy()
+        def _process_page(idx: int) -> np.ndarray:
             # perform opening (erosion + dilatation)
-            bitmap_ = cv2.morphologyEx(bitmap_, cv2.MORPH_OPEN, kernel)
-            boxes = self.bitmap_to_boxes(pred=p_, bitmap=bitmap_)
-            boxes_batch.append(boxes)
+            bitmap_ = cv2.morphologyEx(bitmap[idx], cv2.MORPH_OPEN, kernel)
+            boxes = self.bitmap_to_boxes(pred=p[idx], bitmap=bitmap_)
+            if valid_ratios is not None:
+                # Remove the padding
+                boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]] / valid_ratios[idx, 1], 0, 1)
+                boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]] / valid_ratios[idx, 0], 0, 1)
+            return boxes
+
+        # OpenCV & NumPy release the GIL
+        boxes_batch = list(multithread_exec(_process_page, range(p.shape[0]), threads=self.workers))
 
         return boxes_batch
 
@@ -165,6 +263,14 @@ class DetectionPredictor(NestedObject):
         pre_processor: transform inputs for easier batched model inference
         model: core detection architecture
         post_processor: post process model outputs
+        compiled: whether the model should be run in inference mode through graphs traced with fixed input shapes
+        tiled: whether pages larger than the model input should be split into overlapping tiles at native scale
+            rather than being resized
+        tile_overlap: overlap between neighbouring tiles, as a fraction of the tile size
+        tile_merge: how boxes detected at tile seams are merged, either 'union' (enclosing box) or 'nms'
+            (the box with the highest score is kept)
+        merge_thresh: minimal ratio of intersection over the smallest box area for two boxes of different tiles
+            to be merged
     """
 
     _children_names: List[str] = ['pre_processor', 'model', 'post_processor']
@@ -174,11 +280,180 @@ class DetectionPredictor(NestedObject):
         pre_processor: DetectionPreProcessor,
         model: DetectionModel,
         post_processor: DetectionPostProcessor,
+        compiled: bool = False,
+        tiled: bool = False,
+        tile_overlap: float = 0.1,
+        tile_merge: str = 'union',
+        merge_thresh: float = 0.5,
     ) -> None:
 
+        if tile_merge not in ('union', 'nms'):
+            raise ValueError(f"unsupported tile merging method: {tile_merge}")
         self.pre_processor = pre_processor
         self.model = model
         self.post_processor = post_processor
+        self.compiled = compiled
+        self.tiled = tiled
+        self.tile_overlap = tile_overlap
+        self.tile_merge = tile_merge
+        self.merge_thresh = merge_thresh
+        self._graphs: Dict[Tuple[int, ...], Any] = {}
+
+    def forward(
+        self,
+        batch: tf.Tensor,
+        **kwargs: Any,
+    ) -> Dict[str, tf.Tensor]:
+        """Run the model on a preprocessed batch
+
+        Args:
+            batch: preprocessed batch of shape (N, H, W, C)
+            kwargs: keyword arguments of the model, ignored in compiled mode
+
+        Returns:
+            the model output
+        """
+        if self.compiled:
+            return compiled_forward(self.model, self._graphs, batch, self.pre_processor.batch_size)
+        return self.model(batch, **kwargs)
+
+    def warmup(self) -> None:
+        """Run the model once on the configured input shape, so that graphs are traced before the first request"""
+        self.forward(tf.zeros((self.pre_processor.batch_size, *self.pre_processor.output_size, 3)), training=False)
+
+    def get_tiles(self, page_shape: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        """Split a page into overlapping tiles of the model input size
+
+        Args:
+            page_shape: shape of the page in format (H, W)
+
+        Returns:
+            list of tiles in format (xmin, ymin, xmax, ymax), in absolute coordinates of the page
+        """
+
+        starts = []
+        for length, tile_length in zip(page_shape, self.pre_processor.output_size):
+            stride = max(1, tile_length * (1 - self.tile_overlap))
+            # Smallest number of evenly spread tiles covering the page with the minimal overlap
+            num_tiles = 1 + math.ceil(max(length - tile_length, 0) / stride)
+            starts.append(np.linspace(0, max(length - tile_length, 0), num_tiles).round().astype(int).tolist())
+
+        return [
+            (x, y, min(x + self.pre_processor.output_size[1], page_shape[1]),
+             min(y + self.pre_processor.output_size[0], page_shape[0]))
+            for y in starts[0] for x in starts[1]
+        ]
+
+    def merge_tile_boxes(
+        self,
+        boxes: np.ndarray,
+        tile_idxs: np.ndarray,
+        tiles: List[Tuple[int, int, int, int]],
+    ) -> np.ndarray:
+        """Merge the boxes that were detected twice at the seams of overlapping tiles
+
+        Args:
+            boxes: boxes of shape (N, 5) in absolute coordinates of the page, with their score
+            tile_idxs: index of the tile each box was detected in, of shape (N,)
+            tiles: list of tiles in format (xmin, ymin, xmax, ymax)
+
+        Returns:
+            merged boxes of shape (M, 5)
+        """
+
+        # Pairs of boxes from overlapping tiles that cover the same area, with their overlap ratio
+        pairs: List[Tuple[float, int, int]] = []
+        for idx, tile in enumerate(tiles):
+            for _idx in range(idx + 1, len(tiles)):
+                _tile = tiles[_idx]
+                if min(tile[2], _tile[2]) <= max(tile[0], _tile[0]) or min(tile[3], _tile[3]) <= max(tile[1], _tile[1]):
+                    continue
+                box_idxs, _box_idxs = np.where(tile_idxs == idx)[0], np.where(tile_idxs == _idx)[0]
+                if box_idxs.size == 0 or _box_idxs.size == 0:
+                    continue
+                b1, b2 = boxes[box_idxs, :4], boxes[_box_idxs, :4]
+                width = np.minimum(b1[:, None, 2], b2[None, :, 2]) - np.maximum(b1[:, None, 0], b2[None, :, 0])
+                height = np.minimum(b1[:, None, 3], b2[None, :, 3]) - np.maximum(b1[:, None, 1], b2[None, :, 1])
+                intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+                areas_1 = (b1[:, 2] - b1[:, 0]) * (b1[:, 3] - b1[:, 1])
+                areas_2 = (b2[:, 2] - b2[:, 0]) * (b2[:, 3] - b2[:, 1])
+                # Intersection over the smallest box, so that a word cut by a tile border matches the full word
+                ratio = intersection / np.maximum(np.minimum(areas_1[:, None], areas_2[None, :]), 1e-6)
+                rows, cols = np.where(ratio >= self.merge_thresh)
+                pairs.extend(zip(ratio[rows, cols].tolist(), box_idxs[rows].tolist(), _box_idxs[cols].tolist()))
+
+        if len(pairs) == 0:
+            return boxes
+
+        if self.tile_merge == 'nms':
+            neighbours: Dict[int, List[int]] = {}
+            for _, idx, _idx in pairs:
+                neighbours.setdefault(idx, []).append(_idx)
+                neighbours.setdefault(_idx, []).append(idx)
+            keep = np.ones(boxes.shape[0], dtype=bool)
+            # Greedily keep the boxes with the highest scores
+            for idx in sorted(neighbours.keys(), key=lambda idx: -boxes[idx, 4]):
+                if keep[idx]:
+                    keep[neighbours[idx]] = False
+            return boxes[keep]
+
+        # Union: each box is merged with at most one other box, the best matching pairs first,
+        # so that separate words overlapping the same box are not chained together
+        merged = boxes.copy()
+        keep = np.ones(boxes.shape[0], dtype=bool)
+        is_paired = np.zeros(boxes.shape[0], dtype=bool)
+        for _, idx, _idx in sorted(pairs, key=lambda pair: -pair[0]):
+            if is_paired[idx] or is_paired[_idx]:
+                continue
+            is_paired[[idx, _idx]] = True
+            merged[idx, [0, 1]] = np.minimum(boxes[idx, [0, 1]], boxes[_idx, [0, 1]])
+            merged[idx, 2:] = np.maximum(boxes[idx, 2:], boxes[_idx, 2:])
+            keep[_idx] = False
+
+        return merged[keep]
+
+    def detect_tiled(
+        self,
+        page: np.ndarray,
+        **kwargs: Any,
+    ) -> np.ndarray:
+        """Localize text elements in a large page by running the model on overlapping tiles at native scale.
+        Tiles are processed by batches, so that the memory footprint is bounded by the tile size.
+
+        Args:
+            page: page of shape (H, W, C)
+            kwargs: keyword arguments of the model
+
+        Returns:
+            boxes of shape (N, 5), in relative coordinates of the page
+        """
+
+        tiles = self.get_tiles(page.shape[:2])
+        batch_size = self.pre_processor.batch_size
+        boxes, tile_idxs = [], []
+        for start_idx in range(0, len(tiles), batch_size):
+            _tiles = tiles[start_idx: start_idx + batch_size]
+            # Tiles at the page borders are zero-padded to the model input size
+            batch = np.zeros((len(_tiles), *self.pre_processor.output_size, page.shape[2]), dtype=page.dtype)
+            for tile, sample in zip(_tiles, batch):
+                sample[:tile[3] - tile[1], :tile[2] - tile[0]] = page[tile[1]: tile[3], tile[0]: tile[2]]
+            out = self.post_processor(self.forward(self.pre_processor.normalize(batch), **kwargs))
+            for tile_idx, (tile, _boxes) in enumerate(zip(_tiles, out), start=start_idx):
+                # Back to absolute page coordinates, discarding the padding
+                _boxes = _boxes.copy()
+                _boxes[:, [0, 2]] = np.clip(tile[0] + _boxes[:, [0, 2]] * self.pre_processor.output_size[1],
+                                            tile[0], tile[2])
+                _boxes[:, [1, 3]] = np.clip(tile[1] + _boxes[:, [1, 3]] * self.pre_processor.output_size[0],
+                                            tile[1], tile[3])
+                _boxes = _boxes[(_boxes[:, 2] > _boxes[:, 0]) & (_boxes[:, 3] > _boxes[:, 1])]
+                boxes.append(_boxes)
+                tile_idxs.append(np.full(_boxes.shape[0], tile_idx))
+
+        merged = self.merge_tile_boxes(np.concatenate(boxes), np.concatenate(tile_idxs), tiles)
+        merged[:, [0, 2]] /= page.shape[1]
+        merged[:, [1, 3]] /= page.shape[0]
+
+        return merged
 
     def __call__(
         self,
@@ -190,9 +465,24 @@ class DetectionPredictor(NestedObject):
         if any(page.ndim != 3 for page in pages):
             raise ValueError("incorrect input shape: all pages are expected to be multi-channel 2D images.")
 
-        processed_batches = self.pre_processor(pages)
-        out = [self.model(batch, **kwargs) for batch in processed_batches]
-        out = [self.post_processor(batch) for batch in out]
-        out = [boxes for batch in out for boxes in batch]
-
-        return out
+        height, width = self.pre_processor.output_size
+        is_tiled = [self.tiled and (page.shape[0] > height or page.shape[1] > width) for page in pages]
+        if not any(is_tiled):
+            valid_ratios: List[Optional[np.ndarray]]
+            if self.pre_processor.preserve_aspect_ratio and isinstance(pages, list):
+                processed_batches, _ratios = self.pre_processor.letterbox_inputs(pages)
+                valid_ratios = list(_ratios)
+            else:
+                processed_batches = self.pre_processor(pages)
+                valid_ratios = [None] * len(processed_batches)
+            out = [self.forward(batch, **kwargs) for batch in processed_batches]
+            batch_boxes = [self.post_processor(batch, ratios) for batch, ratios in zip(out, valid_ratios)]
+            return [boxes for batch in batch_boxes for boxes in batch]
+
+        # Large pages are processed tile by tile, the others are resized
+        resized_pages = [page for page, _tiled in zip(pages, is_tiled) if not _tiled]
+        resized_boxes = iter(self(resized_pages, **kwargs) if len(resized_pages) > 0 else [])
+        return [
+            self.detect_tiled(page, **kwargs) if _tiled else next(resized_boxes)
+            for page, _tiled in zip(pages, is_tiled)
+        ]
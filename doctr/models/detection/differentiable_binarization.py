@@ -46,6 +46,9 @@ class DBPostProcessor(DetectionPostProcessor):
         max_candidates: maximum boxes to consider in a single page
         box_thresh: minimal objectness score to consider a box
         bin_thresh: threshold used to binzarized p_map at inference time
+        vectorized: whether boxes should be computed for all connected components at once, using closed-form
+            scores and unclipping distances instead of polygon approximations
+        workers: number of threads processing the pages of a batch concurrently
 
     """
     def __init__(
@@ -54,14 +57,18 @@ class DBPostProcessor(DetectionPostProcessor):
         max_candidates: int = 1000,
         box_thresh: float = 0.1,
         bin_thresh: float = 0.3,
+        vectorized: bool = False,
+        workers: Optional[int] = 1,
     ) -> None:
 
         super().__init__(
             box_thresh,
-            bin_thresh
+            bin_thresh,
+            workers,
         )
         self.unclip_ratio = unclip_ratio
         self.max_candidates = max_candidates
+        self.vectorized = vectorized
 
     def polygon_to_box(
         self,
@@ -111,6 +118,9 @@ class DBPostProcessor(DetectionPostProcessor):
             np tensor boxes for the bitmap, each box is a 5-element list
                 containing x, y, w, h, score for the box
         """
+        if self.vectorized:
+            return self.components_to_boxes(pred, bitmap)
+
         height, width = bitmap.shape[:2]
         min_size_box = 1 + int(height / 512)
         boxes = []
@@ -138,6 +148,61 @@ class DBPostProcessor(DetectionPostProcessor):
             boxes.append([xmin, ymin, xmax, ymax, score])
         return np.clip(np.asarray(boxes), 0, 1) if len(boxes) > 0 else np.zeros((0, 5), dtype=np.float32)
 
+    def components_to_boxes(
+        self,
+        pred: np.ndarray,
+        bitmap: np.ndarray,
+    ) -> np.ndarray:
+        """Compute boxes from a bitmap/pred_map, processing all connected components at once: scores are computed
+        with a summed-area table, and unclipping distances in closed form from the area and perimeter of components
+
+        Args:
+            pred: Pred map from differentiable binarization output
+            bitmap: Bitmap map computed from pred (binarized)
+
+        Returns:
+            np tensor boxes for the bitmap, each box is a 5-element list
+                containing xmin, ymin, xmax, ymax, score for the box
+        """
+        height, width = bitmap.shape[:2]
+        min_size_box = 1 + int(height / 512)
+        _bitmap = bitmap.astype(np.uint8)
+        # Label connected components (the first one is the background)
+        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(_bitmap, connectivity=8)
+        stats = stats[1: self.max_candidates + 1]
+        if stats.shape[0] == 0:
+            return np.zeros((0, 5), dtype=np.float32)
+        x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+        w, h = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+
+        # Number of boundary pixels of each component
+        eroded = cv2.erode(_bitmap, np.ones((3, 3), np.uint8), borderType=cv2.BORDER_CONSTANT, borderValue=(0,))
+        boundary = _bitmap - eroded
+        perimeter = np.bincount(labels[boundary > 0], minlength=num_labels)[1: self.max_candidates + 1]
+        # Area of the polygon joining boundary pixels (Pick's theorem)
+        area = stats[:, cv2.CC_STAT_AREA] - perimeter / 2 - 1
+
+        # Mean of the pred map over the bounding box of each component
+        integral = cv2.integral(pred.astype(np.float32))
+        score = (integral[y + h, x + w] - integral[y, x + w] - integral[y + h, x] + integral[y, x]) / (w * h)
+
+        # Expanding a polygon by a given distance expands its bounding box by the same distance on each side
+        distance = np.round(area * self.unclip_ratio / np.maximum(perimeter, 1))
+        xmin, ymin = x - distance, y - distance
+        box_w, box_h = w + 2 * distance, h + 2 * distance
+
+        # Remove too small components, flat polygons, weak objectness and too small boxes
+        is_kept = (
+            (np.minimum(w, h) - 1 >= min_size_box) & (area > 0) & (score >= self.box_thresh)
+            & (np.minimum(box_w, box_h) >= min_size_box)
+        )
+        boxes = np.stack(
+            (xmin / width, ymin / height, (xmin + box_w) / width, (ymin + box_h) / height, score),
+            axis=1,
+        )[is_kept]
+
+        return np.clip(boxes, 0, 1).astype(np.float32)
+
 
 class FeaturePyramidNetwork(layers.Layer, NestedObject):
     """Feature Pyramid Network as described in `"Feature Pyramid Networks for Object Detection"
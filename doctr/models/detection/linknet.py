@@ -39,6 +39,7 @@ class LinkNetPostProcessor(DetectionPostProcessor):
         min_size_box: minimal length (pix) to keep a box
         box_thresh: minimal objectness score to consider a box
         bin_thresh: threshold used to binzarized p_map at inference time
+        workers: number of threads processing the pages of a batch concurrently
 
     """
     def __init__(
@@ -46,10 +47,12 @@ class LinkNetPostProcessor(DetectionPostProcessor):
         min_size_box: int = 3,
         bin_thresh: float = 0.15,
         box_thresh: float = 0.1,
+        workers: Optional[int] = 1,
     ) -> None:
         super().__init__(
             box_thresh,
-            bin_thresh
+            bin_thresh,
+            workers,
         )
 
     def bitmap_to_boxes(
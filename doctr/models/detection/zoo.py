@@ -3,7 +3,7 @@
 # This program is licensed under the Apache License version 2.
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .core import DetectionPredictor, DetectionPreProcessor
 from .. import detection
 
@@ -16,7 +16,14 @@ default_cfgs: Dict[str, Dict[str, Any]] = {
 }
 
 
-def _predictor(arch: str, pretrained: bool, **kwargs: Any) -> DetectionPredictor:
+def _predictor(
+    arch: str,
+    pretrained: bool,
+    compiled: bool = False,
+    workers: Optional[int] = 1,
+    tiled: bool = False,
+    **kwargs: Any
+) -> DetectionPredictor:
 
     if default_cfgs.get(arch) is None:
         raise ValueError(f"unknown architecture '{arch}'")
@@ -28,7 +35,9 @@ def _predictor(arch: str, pretrained: bool, **kwargs: Any) -> DetectionPredictor
     predictor = DetectionPredictor(
         DetectionPreProcessor(output_size=_model.cfg['input_shape'][:2], **kwargs),
         _model,
-        detection.__dict__[default_cfgs[arch]['post_processor']]()
+        detection.__dict__[default_cfgs[arch]['post_processor']](workers=workers),
+        compiled=compiled,
+        tiled=tiled,
     )
     return predictor
 
@@ -46,6 +55,9 @@ def detection_predictor(arch: str = 'db_resnet50', pretrained: bool = False, **k
     Args:
         arch: name of the architecture to use ('db_resnet50')
         pretrained: If True, returns a model pre-trained on our text detection dataset
+        compiled: If True, the model is run in inference mode through graphs traced with fixed input shapes
+        workers: number of threads post-processing the pages of a batch concurrently (None for automatic)
+        tiled: If True, pages larger than the model input are processed by overlapping tiles at native scale
 
     Returns:
         Detection predictor
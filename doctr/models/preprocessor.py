@@ -3,9 +3,12 @@
 # This program is licensed under the Apache License version 2.
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
+import cv2
+import multiprocessing as mp
 import tensorflow as tf
 import numpy as np
-from typing import List, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Union, Optional
 
 from doctr.utils.repr import NestedObject
 
@@ -13,6 +16,16 @@ from doctr.utils.repr import NestedObject
 __all__ = ['PreProcessor']
 
 
+CV2_INTERPOLATIONS = {
+    'bilinear': cv2.INTER_LINEAR,
+    'nearest': cv2.INTER_NEAREST,
+    'bicubic': cv2.INTER_CUBIC,
+    'area': cv2.INTER_AREA,
+    'lanczos3': cv2.INTER_LANCZOS4,
+    'lanczos5': cv2.INTER_LANCZOS4,
+}
+
+
 class PreProcessor(NestedObject):
     """Implements an abstract preprocessor object which performs casting, resizing, batching and normalization.
 
@@ -22,23 +35,35 @@ class PreProcessor(NestedObject):
         mean: mean value of the training distribution by channel
         std: standard deviation of the training distribution by channel
         interpolation: one of 'bilinear', 'nearest', 'bicubic', 'area', 'lanczos3', 'lanczos5'
+        backend: 'tensorflow' to resize each sample with tf.image, or 'opencv' to resize all samples with OpenCV
+            in parallel threads into a single preallocated buffer
 
     """
 
+    # Batches smaller than this are resized in the calling thread
+    _min_parallel_samples: int = 8
+
     def __init__(
         self,
         output_size: Tuple[int, int],
         batch_size: int,
         mean: Tuple[float, float, float] = (.5, .5, .5),
         std: Tuple[float, float, float] = (1., 1., 1.),
-        interpolation: str = 'bilinear'
+        interpolation: str = 'bilinear',
+        backend: str = 'tensorflow',
     ) -> None:
 
+        if backend not in ('tensorflow', 'opencv'):
+            raise ValueError(f"unsupported backend '{backend}'")
         self.output_size = output_size
         self.mean = tf.cast(mean, dtype=tf.float32)
         self.std = tf.cast(std, dtype=tf.float32)
         self.batch_size = batch_size
         self.interpolation = interpolation
+        self.backend = backend
+        # Threads are only started on the first parallel resizing, and reused by the following ones
+        self._workers = min(16, mp.cpu_count())
+        self._executor = ThreadPoolExecutor(self._workers)
 
     def resize(
         self,
@@ -46,6 +71,64 @@ class PreProcessor(NestedObject):
     ) -> tf.Tensor:
         raise NotImplementedError
 
+    def resize_into(
+        self,
+        x: np.ndarray,
+        out: np.ndarray,
+    ) -> None:
+        """Resize an image with OpenCV and write it into a preallocated buffer
+
+        Args:
+            x: image as a np.ndarray
+            out: zero-initialized destination of shape (H, W, C)
+        """
+        raise NotImplementedError
+
+    def pack_inputs(
+        self,
+        x: List[np.ndarray],
+        output_size: Optional[Tuple[int, int]] = None,
+    ) -> np.ndarray:
+        """Resize samples in parallel into a single contiguous buffer
+
+        Args:
+            x: list of samples (np.ndarray)
+            output_size: size of each resized sample in format (H, W), defaults to the output size of the preprocessor
+
+        Returns:
+            buffer of shape (N, H, W, C), encoded in uint8 if all samples are
+        """
+        output_size = self.output_size if output_size is None else output_size
+        dtype = np.uint8 if all(sample.dtype == np.uint8 for sample in x) else np.float32
+        buffer = np.zeros((len(x), *output_size, x[0].shape[-1]), dtype=dtype)
+
+        def _resize_range(bounds: Tuple[int, int]) -> None:
+            for idx in range(*bounds):
+                self.resize_into(x[idx], buffer[idx])
+
+        num_chunks = min(self._workers, len(x) // self._min_parallel_samples)
+        if num_chunks < 2:
+            _resize_range((0, len(x)))
+        else:
+            # One contiguous range of samples per thread (OpenCV releases the GIL)
+            bounds = np.linspace(0, len(x), num_chunks + 1).astype(int).tolist()
+            _ = list(self._executor.map(_resize_range, zip(bounds[:-1], bounds[1:])))
+        return buffer
+
+    def split_inputs(
+        self,
+        x: Union[tf.Tensor, np.ndarray],
+    ) -> List[Union[tf.Tensor, np.ndarray]]:
+        """Split a stack of samples into batches
+
+        Args:
+            x: samples stacked along the first axis
+
+        Returns:
+            list of batched samples
+        """
+        return [x[idx: idx + self.batch_size] for idx in range(0, x.shape[0], self.batch_size)]
+
     def normalize(
         self,
         x: tf.Tensor
@@ -87,16 +170,26 @@ class PreProcessor(NestedObject):
 
     def __call__(
         self,
-        x: Union[tf.Tensor, List[np.ndarray]]
+        x: Union[tf.Tensor, np.ndarray, List[np.ndarray]]
     ) -> List[tf.Tensor]:
         """Prepare document data for model forwarding
 
         Args:
-            x: list of images (np.array) or tf.Tensor (already resized and batched)
+            x: list of images (np.array), np.array of packed images (already resized), or tf.Tensor (already
+                resized and batched)
         Returns:
             list of page batches
         """
         # Check input type
+        if isinstance(x, np.ndarray):
+            # Samples already resized and packed in a single buffer (cf. `pack_inputs`)
+            if x.ndim != 4 or x.shape[1:3] != tuple(self.output_size):
+                raise ValueError(f"packed inputs are expected to be of shape (N, {self.output_size[0]}, "
+                                 f"{self.output_size[1]}, C)")
+            return self.split_inputs(self.normalize(x))
+        if isinstance(x, list) and self.backend == 'opencv':
+            # Resize all samples into a single buffer, and normalize it at once
+            return self.split_inputs(self.normalize(self.pack_inputs(x)))
         if isinstance(x, list):
             # convert images to tf
             tensors = [tf.cast(sample, dtype=tf.float32) for sample in x]
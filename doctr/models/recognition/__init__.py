@@ -1,4 +1,6 @@
 from .core import *
+from .ctc import *
 from .crnn import *
 from .sar import *
+from .scheduler import *
 from .zoo import *
@@ -3,12 +3,15 @@
 # This program is licensed under the Apache License version 2.
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
+import math
+import cv2
 import tensorflow as tf
 from tensorflow import keras
-from typing import Tuple, List, Any, Optional, Dict
+from typing import Tuple, List, Any, Optional, Dict, Union
 import numpy as np
 
-from ..preprocessor import PreProcessor
+from ..preprocessor import PreProcessor, CV2_INTERPOLATIONS
+from .._utils import compiled_forward
 from doctr.utils.repr import NestedObject
 from doctr.datasets import encode_sequences
 
@@ -29,6 +32,9 @@ class RecognitionPreProcessor(PreProcessor):
         batch_size: the size of page batches
         mean: mean value of the training distribution by channel
         std: standard deviation of the training distribution by channel
+        interpolation: one of 'bilinear', 'nearest', 'bicubic', 'area', 'lanczos3', 'lanczos5'
+        num_buckets: number of width buckets crops are grouped into by `bucket_inputs`
+        backend: 'tensorflow' or 'opencv' (batched resizing with multiple threads)
     """
 
     def __init__(
@@ -38,13 +44,25 @@ class RecognitionPreProcessor(PreProcessor):
         mean: Tuple[float, float, float] = (.5, .5, .5),
         std: Tuple[float, float, float] = (1., 1., 1.),
         interpolation: str = 'bilinear',
+        num_buckets: int = 1,
+        backend: str = 'tensorflow',
     ) -> None:
 
-        super().__init__(output_size, batch_size, mean, std, interpolation)
+        super().__init__(output_size, batch_size, mean, std, interpolation, backend)
+        self.num_buckets = num_buckets
+
+    @property
+    def bucket_widths(self) -> List[int]:
+        """Padded widths of the buckets, rounded up to a multiple of 8 so that they match the backbones' strides"""
+        width = self.output_size[1]
+        return sorted({
+            min(width, 8 * math.ceil(width * (idx + 1) / (8 * self.num_buckets))) for idx in range(self.num_buckets)
+        })
 
     def resize(
         self,
         x: tf.Tensor,
+        output_size: Optional[Tuple[int, int]] = None,
     ) -> tf.Tensor:
         """Resize images using tensorflow backend.
         The images is resized to (output_height, width) where width is computed as follow :
@@ -56,20 +74,76 @@ class RecognitionPreProcessor(PreProcessor):
 
         Args:
             x: image as a tf.Tensor
+            output_size: target size in format (H, W), defaults to the output size of the preprocessor
 
         Returns:
             the processed image after being resized
         """
+        output_size = self.output_size if output_size is None else output_size
         if x.shape[0] == 0 or x.shape[1] == 0:
-            return tf.zeros((*self.output_size, 3))
+            return tf.zeros((*output_size, 3))
 
         # Preserve aspect ratio during resizing
-        resized = tf.image.resize(x, self.output_size, method=self.interpolation, preserve_aspect_ratio=True)
+        resized = tf.image.resize(x, output_size, method=self.interpolation, preserve_aspect_ratio=True)
         # Pad on the side that is still too small
-        padded = tf.image.pad_to_bounding_box(resized, 0, 0, *self.output_size)
+        padded = tf.image.pad_to_bounding_box(resized, 0, 0, *output_size)
 
         return padded
 
+    def resize_into(
+        self,
+        x: np.ndarray,
+        out: np.ndarray,
+    ) -> None:
+        """Resize images using OpenCV backend, preserving the aspect ratio like `resize`.
+
+        Args:
+            x: image as a np.ndarray
+            out: zero-initialized destination of shape (H, W, C), padded to the right and to the bottom
+        """
+        if x.shape[0] == 0 or x.shape[1] == 0:
+            return
+
+        scale = min(out.shape[0] / x.shape[0], out.shape[1] / x.shape[1])
+        height = min(out.shape[0], max(1, round(scale * x.shape[0])))
+        width = min(out.shape[1], max(1, round(scale * x.shape[1])))
+        out[:height, :width] = cv2.resize(x, (width, height), interpolation=CV2_INTERPOLATIONS[self.interpolation])
+
+    def bucket_inputs(
+        self,
+        x: List[np.ndarray],
+    ) -> Tuple[List[tf.Tensor], np.ndarray]:
+        """Sort crops by aspect ratio and group them into width buckets, so that short words are only padded
+        to the width of their bucket rather than to the full output width
+
+        Args:
+            x: list of crops (np.ndarray)
+
+        Returns:
+            a tuple with the list of normalized batches, and the indices of the crops in the batch order
+        """
+        height, width = self.output_size
+        # Width of each crop once resized to the target height
+        resized_widths = np.asarray([min(width, height * crop.shape[1] / max(crop.shape[0], 1)) for crop in x])
+        order = resized_widths.argsort(kind='stable')
+        bucket_widths = self.bucket_widths
+        # Smallest bucket able to hold each crop
+        bucket_idxs = np.searchsorted(bucket_widths, resized_widths[order])
+
+        processed_batches = []
+        for bucket_idx, bucket_width in enumerate(bucket_widths):
+            idxs = order[bucket_idxs == bucket_idx]
+            if idxs.size == 0:
+                continue
+            if self.backend == 'opencv':
+                buffer = self.normalize(self.pack_inputs([x[idx] for idx in idxs], (height, bucket_width)))
+                processed_batches.extend(self.split_inputs(buffer))
+            else:
+                samples = [self.resize(tf.cast(x[idx], dtype=tf.float32), (height, bucket_width)) for idx in idxs]
+                processed_batches.extend([self.normalize(b) for b in self.batch_inputs(samples)])
+
+        return processed_batches, order
+
 
 class RecognitionModel(keras.Model, NestedObject):
     """Implements abstract RecognitionModel class"""
@@ -135,11 +209,37 @@ class RecognitionPostProcessor(NestedObject):
     def extra_repr(self) -> str:
         return f"vocab_size={len(self.vocab)}"
 
+    @staticmethod
+    def _step_confidences(logits: np.ndarray) -> np.ndarray:
+        """Compute the probability of the most likely class at each step, without computing the full softmax
+
+        Args:
+            logits: raw output of the model, of shape (N, SEQ_LEN, NUM_CLASSES)
+
+        Returns:
+            the probabilities of the most likely classes, of shape (N, SEQ_LEN)
+        """
+        return 1 / np.exp(logits - logits.max(axis=-1, keepdims=True)).sum(axis=-1)
+
+    def decode(
+        self,
+        x: tf.Tensor,
+    ) -> Tuple[List[str], np.ndarray]:
+        """Decode the raw output of the model
+
+        Args:
+            x: raw output of the model, of shape (N, SEQ_LEN, NUM_CLASSES)
+
+        Returns:
+            a tuple with the list of decoded words, and their confidence scores of shape (N,)
+        """
+        raise NotImplementedError
+
     def __call__(
         self,
-        x: List[tf.Tensor],
+        x: tf.Tensor,
     ) -> List[str]:
-        raise NotImplementedError
+        return self.decode(x)[0]
 
 
 class RecognitionPredictor(NestedObject):
@@ -149,6 +249,7 @@ class RecognitionPredictor(NestedObject):
         pre_processor: transform inputs for easier batched model inference
         model: core detection architecture
         post_processor: post process model outputs
+        compiled: whether the model should be run in inference mode through graphs traced with fixed input shapes
     """
 
     _children_names: List[str] = ['pre_processor', 'model', 'post_processor']
@@ -158,31 +259,97 @@ class RecognitionPredictor(NestedObject):
         pre_processor: RecognitionPreProcessor,
         model: RecognitionModel,
         post_processor: RecognitionPostProcessor,
+        compiled: bool = False,
     ) -> None:
 
         self.pre_processor = pre_processor
         self.model = model
         self.post_processor = post_processor
+        self.compiled = compiled
+        self._graphs: Dict[Tuple[int, ...], Any] = {}
 
-    def __call__(
+    def forward(
         self,
-        crops: List[np.ndarray],
+        batch: tf.Tensor,
         **kwargs: Any,
-    ) -> List[str]:
+    ) -> tf.Tensor:
+        """Run the model on a preprocessed batch
+
+        Args:
+            batch: preprocessed batch of shape (N, H, W, C)
+            kwargs: keyword arguments of the model, ignored in compiled mode
 
-        out = []
+        Returns:
+            the model output
+        """
+        if self.compiled:
+            return compiled_forward(self.model, self._graphs, batch, self.pre_processor.batch_size)
+        return self.model(batch, **kwargs)
+
+    def warmup(self) -> None:
+        """Run the model once on each configured input shape, so that graphs are traced before the first request"""
+        height, width = self.pre_processor.output_size
+        widths = self.pre_processor.bucket_widths if self.pre_processor.num_buckets > 1 else [width]
+        for width in widths:
+            self.forward(tf.zeros((self.pre_processor.batch_size, height, width, 3)), training=False)
+
+    def predict(
+        self,
+        crops: Union[List[np.ndarray], np.ndarray],
+        **kwargs: Any,
+    ) -> Tuple[List[str], np.ndarray]:
+        """Identify character sequences in crops, along with their recognition confidence
+
+        Args:
+            crops: list of crops (np.ndarray of shape H x W x C), or crops already resized and packed into a single
+                np.ndarray of shape (N, H, W, C) (cf. `extract_packed_crops`)
+            kwargs: keyword arguments of the model
+
+        Returns:
+            a tuple with the list of character sequences, and their confidence scores of shape (N,)
+        """
+
+        out: List[str] = []
+        confidences = np.zeros(0, dtype=np.float32)
         if len(crops) > 0:
             # Dimension check
             if any(crop.ndim != 3 for crop in crops):
                 raise ValueError("incorrect input shape: all crops are expected to be multi-channel 2D images.")
 
             # Resize & batch them
-            processed_batches = self.pre_processor(crops)
+            if self.pre_processor.num_buckets > 1 and isinstance(crops, list):
+                processed_batches, order = self.pre_processor.bucket_inputs(crops)
+            else:
+                processed_batches, order = self.pre_processor(crops), None
+
+            # Forward it & process outputs
+            decoded = [self.post_processor.decode(self.forward(batch, **kwargs)) for batch in processed_batches]
+            out = [charseq for charseqs, _ in decoded for charseq in charseqs]
+            confidences = np.concatenate([_confidences for _, _confidences in decoded])
+
+            # Restore the original order of the crops
+            if order is not None:
+                _out = out
+                out = [''] * len(crops)
+                for idx, charseq in zip(order, _out):
+                    out[idx] = charseq
+                confidences[order] = confidences.copy()
+
+        return out, confidences
 
-            # Forward it
-            out = [self.model(batch, **kwargs) for batch in processed_batches]
+    def __call__(
+        self,
+        crops: Union[List[np.ndarray], np.ndarray],
+        **kwargs: Any,
+    ) -> List[str]:
+        """Identify character sequences in crops
 
-            # Process outputs
-            out = [charseq for batch in out for charseq in self.post_processor(batch)]
+        Args:
+            crops: list of crops (np.ndarray of shape H x W x C), or crops already resized and packed into a single
+                np.ndarray of shape (N, H, W, C) (cf. `extract_packed_crops`)
+            kwargs: keyword arguments of the model
 
-        return out
+        Returns:
+            list of character sequences
+        """
+        return self.predict(crops, **kwargs)[0]
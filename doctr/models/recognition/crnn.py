@@ -4,6 +4,7 @@
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
 from copy import deepcopy
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers
 from tensorflow.keras.models import Sequential
@@ -12,6 +13,7 @@ from typing import Tuple, Dict, Any, Optional, List
 from .. import backbones
 from ..utils import load_pretrained_params
 from .core import RecognitionModel, RecognitionPostProcessor
+from .ctc import Lexicon, ctc_beam_search
 
 __all__ = ['CRNN', 'crnn_vgg16_bn', 'crnn_resnet31', 'CTCPostProcessor']
 
@@ -47,8 +49,35 @@ class CTCPostProcessor(RecognitionPostProcessor):
         vocab: string containing the ordered sequence of supported characters
         ignore_case: if True, ignore case of letters
         ignore_accents: if True, ignore accents of letters
+        backend: 'numpy' (decoding with array operations over the whole batch) or 'tensorflow'
+        beam_width: number of prefixes explored by beam search decoding, 1 meaning best path decoding
+        lexicon: if specified, beam search only explores the prefixes of the words and patterns of the lexicon
+            (only supported by the 'numpy' backend)
     """
 
+    def __init__(
+        self,
+        vocab: str,
+        ignore_case: bool = False,
+        ignore_accents: bool = False,
+        backend: str = 'numpy',
+        beam_width: int = 1,
+        lexicon: Optional[Lexicon] = None,
+    ) -> None:
+
+        super().__init__(vocab, ignore_case, ignore_accents)
+        if backend not in ('numpy', 'tensorflow'):
+            raise ValueError(f"unsupported backend: {backend}")
+        if beam_width < 1:
+            raise ValueError("the beam width is expected to be strictly positive.")
+        if isinstance(lexicon, Lexicon) and (backend != 'numpy' or lexicon.vocab != vocab):
+            raise ValueError("lexicons are only supported by the 'numpy' backend, with the same vocab.")
+        self.backend = backend
+        self.beam_width = beam_width
+        self.lexicon = lexicon
+        # Maps class indices to characters
+        self._lookup = np.array(list(vocab), dtype='<U1')
+
     def ctc_decoder(
         self,
         logits: tf.Tensor
@@ -72,10 +101,76 @@ class CTCPostProcessor(RecognitionPostProcessor):
 
         return prediction
 
-    def __call__(
+    def best_path(
         self,
-        logits: tf.Tensor
+        logits: np.ndarray,
     ) -> List[str]:
+        """Decode logits with best path decoding: the most likely class of each step is selected, repeated classes
+        are collapsed and blanks are removed, for the whole batch at once
+
+        Args:
+            logits: raw output of the model, shape BATCH_SIZE X SEQ_LEN X NUM_CLASSES + 1
+
+        Returns:
+            A list of decoded words of length BATCH_SIZE
+        """
+        path = logits.argmax(axis=-1)
+        # Keep the first step of each run of identical classes, unless it is a blank
+        keep = path != len(self.vocab)
+        keep[:, 1:] &= path[:, 1:] != path[:, :-1]
+
+        return self._join(path, keep)
+
+    def _join(self, labels: np.ndarray, mask: np.ndarray) -> List[str]:
+        """Assemble the characters of all words at once, then split them
+
+        Args:
+            labels: class indices of shape BATCH_SIZE X SEQ_LEN
+            mask: boolean mask of the classes to keep, of the same shape
+
+        Returns:
+            A list of words of length BATCH_SIZE
+        """
+        chars = ''.join(self._lookup[labels[mask]].tolist())
+        ends = np.cumsum(mask.sum(axis=1)).tolist()
+
+        return [chars[start: end] for start, end in zip([0] + ends[:-1], ends)]
+
+    def beam_search(
+        self,
+        logits: np.ndarray,
+    ) -> Tuple[List[str], np.ndarray]:
+        """Decode logits with prefix beam search, constrained by the lexicon if any
+
+        Args:
+            logits: raw output of the model, shape BATCH_SIZE X SEQ_LEN X NUM_CLASSES + 1
+
+        Returns:
+            A tuple with the list of decoded words of length BATCH_SIZE, and their probabilities per step
+        """
+        if self.backend == 'numpy':
+            log_probs = logits - logits.max(axis=-1, keepdims=True)
+            log_probs -= np.log(np.exp(log_probs).sum(axis=-1, keepdims=True))
+            labels, log_likelihoods = ctc_beam_search(log_probs, self.beam_width, self.lexicon)
+        else:
+            decoded, _log_likelihoods = tf.nn.ctc_beam_search_decoder(
+                tf.transpose(logits, perm=[1, 0, 2]),
+                tf.fill(logits.shape[0], logits.shape[1]),
+                beam_width=self.beam_width,
+                top_paths=1,
+            )
+            labels = tf.sparse.to_dense(decoded[0], default_value=-1).numpy()
+            log_likelihoods = _log_likelihoods[:, 0].numpy()
+
+        # Geometric mean of the step probabilities, on the same scale as the confidence of best path decoding
+        confidences = np.minimum(np.exp(log_likelihoods / logits.shape[1]), 1).astype(np.float32)
+
+        return self._join(labels, labels >= 0), confidences
+
+    def decode(
+        self,
+        logits: tf.Tensor
+    ) -> Tuple[List[str], np.ndarray]:
         """
         Performs decoding of raw output with CTC and decoding of CTC predictions
         with label_to_idx mapping dictionnary
@@ -84,19 +179,32 @@ class CTCPostProcessor(RecognitionPostProcessor):
             logits: raw output of the model, shape BATCH_SIZE X SEQ_LEN X NUM_CLASSES + 1
 
         Returns:
-            A list of decoded words of length BATCH_SIZE
+            A tuple with the list of decoded words of length BATCH_SIZE, and their confidence scores: the probability
+            of the least likely step of the best path, or the probability of the word per step (geometric mean) with
+            beam search decoding
 
         """
-        # decode ctc for ctc models
-        predictions = self.ctc_decoder(logits)
-
-        _decoded_strings_pred = tf.strings.reduce_join(
-            inputs=tf.nn.embedding_lookup(self._embedding, predictions),
-            axis=-1
-        )
-        _decoded_strings_pred = tf.strings.split(_decoded_strings_pred, "<eos>")
-        decoded_strings_pred = tf.sparse.to_dense(_decoded_strings_pred.to_sparse(), default_value='not valid')[:, 0]
-        words_list = [word.decode() for word in list(decoded_strings_pred.numpy())]
+        _logits = logits.numpy() if isinstance(logits, tf.Tensor) else np.asarray(logits)
+
+        if self.beam_width > 1 or isinstance(self.lexicon, Lexicon):
+            words_list, confidences = self.beam_search(_logits)
+        elif self.backend == 'numpy':
+            confidences = self._step_confidences(_logits).min(axis=1)
+            words_list = self.best_path(_logits)
+        else:
+            confidences = self._step_confidences(_logits).min(axis=1)
+            # decode ctc for ctc models
+            predictions = self.ctc_decoder(logits)
+
+            _decoded_strings_pred = tf.strings.reduce_join(
+                inputs=tf.nn.embedding_lookup(self._embedding, predictions),
+                axis=-1
+            )
+            _decoded_strings_pred = tf.strings.split(_decoded_strings_pred, "<eos>")
+            decoded_strings_pred = tf.sparse.to_dense(
+                _decoded_strings_pred.to_sparse(), default_value='not valid'
+            )[:, 0]
+            words_list = [word.decode() for word in list(decoded_strings_pred.numpy())]
 
         if self.ignore_case:
             words_list = [word.lower() for word in words_list]
@@ -104,7 +212,7 @@ class CTCPostProcessor(RecognitionPostProcessor):
         if self.ignore_accents:
             raise NotImplementedError
 
-        return words_list
+        return words_list, confidences
 
 
 class CRNN(RecognitionModel):
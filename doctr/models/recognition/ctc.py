@@ -0,0 +1,305 @@
+# Copyright (C) 2021, Mindee.
+
+# This program is licensed under the Apache License version 2.
+# See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
+
+import string
+import numpy as np
+from itertools import chain
+from typing import List, Tuple, Dict, Optional, Iterable, Sequence
+
+from doctr.utils.repr import NestedObject
+
+__all__ = ['Lexicon', 'ctc_beam_search']
+
+
+# Prefixes are identified by a rolling hash of their classes
+_HASH_BASE = np.uint64(1000003)
+_INVALID_HASH = np.uint64(np.iinfo(np.uint64).max)
+
+
+def _expand_class(chars: str) -> str:
+    """Expand the ranges of a character class (e.g. 'A-Z0-9')"""
+    expanded: List[str] = []
+    idx = 0
+    while idx < len(chars):
+        if idx + 2 < len(chars) and chars[idx + 1] == '-':
+            expanded.extend(chr(code) for code in range(ord(chars[idx]), ord(chars[idx + 2]) + 1))
+            idx += 3
+        else:
+            expanded.append(chars[idx])
+            idx += 1
+    return ''.join(expanded)
+
+
+def _parse_pattern(pattern: str) -> List[List[str]]:
+    """Expand a pattern into the character sets allowed at each position, for each length it accepts
+
+    Args:
+        pattern: literal characters, character classes (e.g. `[A-Z0-9]`) and `\\d`, each of them optionally followed
+            by a repetition (`{n}` or `{m,n}`), where `\\` escapes the next character
+
+    Returns:
+        the list of fixed-length sequences of character sets
+    """
+    atoms: List[Tuple[str, int, int]] = []
+    idx = 0
+    while idx < len(pattern):
+        if pattern[idx] == '\\' and idx + 1 < len(pattern):
+            chars = string.digits if pattern[idx + 1] == 'd' else pattern[idx + 1]
+            idx += 2
+        elif pattern[idx] == '[':
+            end = pattern.find(']', idx + 2)
+            if end < 0:
+                raise ValueError(f"unterminated character class in pattern: {pattern}")
+            chars = _expand_class(pattern[idx + 1: end])
+            idx = end + 1
+        else:
+            chars = pattern[idx]
+            idx += 1
+        min_rep = max_rep = 1
+        if idx < len(pattern) and pattern[idx] == '{':
+            end = pattern.find('}', idx)
+            if end < 0:
+                raise ValueError(f"unterminated repetition in pattern: {pattern}")
+            bounds = pattern[idx + 1: end].split(',')
+            min_rep, max_rep = int(bounds[0]), int(bounds[-1])
+            idx = end + 1
+        atoms.append((chars, min_rep, max_rep))
+
+    sequences: List[List[str]] = [[]]
+    for chars, min_rep, max_rep in atoms:
+        sequences = [seq + [chars] * rep for seq in sequences for rep in range(min_rep, max_rep + 1)]
+
+    return sequences
+
+
+class Lexicon(NestedObject):
+    """Implements a deterministic automaton accepting a set of words and patterns, which constrains the sequences
+    explored by CTC beam search decoding (cf. `CTCPostProcessor`)
+
+    Example::
+        >>> from doctr.models import recognition
+        >>> lexicon = recognition.Lexicon(vocab, words=["Total", "Invoice"], patterns=[r"\\d{2}/\\d{2}/\\d{4}"])
+        >>> post_processor = recognition.CTCPostProcessor(vocab, beam_width=10, lexicon=lexicon)
+
+    Args:
+        vocab: string containing the ordered sequence of supported characters
+        words: accepted words (words with characters out of the vocab are ignored)
+        patterns: accepted patterns, made of literal characters, character classes (e.g. `[A-Z0-9]`) and `\\d`, each
+            of them optionally followed by a repetition (`{n}` or `{m,n}`)
+    """
+
+    def __init__(
+        self,
+        vocab: str,
+        words: Iterable[str] = (),
+        patterns: Iterable[str] = (),
+    ) -> None:
+
+        self.vocab = vocab
+        char_idxs = {char: idx for idx, char in enumerate(vocab)}
+        self._transitions: List[Dict[int, int]] = [{}]
+        self._accepting: List[bool] = [False]
+        self._in_degree: List[int] = [0]
+
+        # A word is the sequence of its single-character sets
+        pattern_seqs = (seq for pattern in patterns for seq in _parse_pattern(pattern))
+        for seq in chain(words, pattern_seqs):
+            class_seq = [sorted({char_idxs[char] for char in chars if char in char_idxs}) for chars in seq]
+            # Sequences that cannot be decoded are ignored
+            if all(len(classes) > 0 for classes in class_seq):
+                self._insert(0, class_seq)
+
+        # Sparse transition table: sorted (state, class) keys, for vectorized lookups
+        keys = np.asarray(
+            [state * len(vocab) + char for state, transitions in enumerate(self._transitions) for char in transitions],
+            dtype=np.int64,
+        )
+        next_states = np.asarray(
+            [next_state for transitions in self._transitions for next_state in transitions.values()],
+            dtype=np.int64,
+        )
+        order = keys.argsort()
+        self._keys, self._next_states = keys[order], next_states[order]
+        self.accepting = np.asarray(self._accepting, dtype=bool)
+        self.num_states = len(self._transitions)
+        del self._transitions, self._accepting, self._in_degree
+
+    def _add_state(self, transitions: Optional[Dict[int, int]] = None, accepting: bool = False) -> int:
+        self._transitions.append(dict(transitions or {}))
+        self._accepting.append(accepting)
+        self._in_degree.append(0)
+        for child in self._transitions[-1].values():
+            self._in_degree[child] += 1
+        return len(self._transitions) - 1
+
+    def _insert(self, state: int, seq: Sequence[List[int]]) -> None:
+        """Add the sequences of classes matching the sets of `seq` to the language accepted from `state`"""
+        if len(seq) == 0:
+            self._accepting[state] = True
+            return
+
+        transitions = self._transitions[state]
+        new_chars: List[int] = []
+        groups: Dict[int, List[int]] = {}
+        for char in seq[0]:
+            if char in transitions:
+                groups.setdefault(transitions[char], []).append(char)
+            else:
+                new_chars.append(char)
+
+        if len(new_chars) > 0:
+            child = self._add_state()
+            for char in new_chars:
+                transitions[char] = child
+            self._in_degree[child] += len(new_chars)
+            self._insert(child, seq[1:])
+
+        for child, chars in groups.items():
+            # States also reached through other transitions are copied before being extended
+            if self._in_degree[child] > len(chars):
+                clone = self._add_state(self._transitions[child], self._accepting[child])
+                for char in chars:
+                    transitions[char] = clone
+                self._in_degree[child] -= len(chars)
+                self._in_degree[clone] += len(chars)
+                child = clone
+            self._insert(child, seq[1:])
+
+    def extra_repr(self) -> str:
+        return f"num_states={self.num_states}"
+
+    def step(self, states: np.ndarray, chars: np.ndarray) -> np.ndarray:
+        """Compute the transitions of the automaton
+
+        Args:
+            states: current states (-1 for rejected prefixes)
+            chars: indices of the characters appended to the prefixes, of the same shape
+
+        Returns:
+            the next states, -1 where the character cannot be appended
+        """
+        if self._keys.size == 0:
+            return np.full(states.shape, -1, dtype=np.int64)
+        keys = states.astype(np.int64) * len(self.vocab) + chars
+        idxs = np.minimum(np.searchsorted(self._keys, keys), self._keys.size - 1)
+        return np.where((self._keys[idxs] == keys) & (states >= 0), self._next_states[idxs], -1)
+
+    def __contains__(self, word: str) -> bool:
+        state = np.zeros(1, dtype=np.int64)
+        for char in word:
+            if char not in self.vocab:
+                return False
+            state = self.step(state, np.array([self.vocab.index(char)]))
+        return bool(state[0] >= 0 and self.accepting[state[0]])
+
+
+def ctc_beam_search(
+    log_probs: np.ndarray,
+    beam_width: int = 10,
+    lexicon: Optional[Lexicon] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """CTC prefix beam search, vectorized over the batch: at each step, the prefixes of all samples are extended with
+    their `beam_width` most likely classes, identical prefixes are merged, and the `beam_width` best ones are kept.
+
+    Args:
+        log_probs: log-probabilities of shape (N, SEQ_LEN, NUM_CLASSES), the blank being the last class
+        beam_width: number of prefixes kept for each sample, and of classes considered to extend them at each step
+        lexicon: if specified, the prefixes that are not accepted by the lexicon are pruned during the search, and
+            the best complete sequence is selected (or the best prefix if no sequence is complete)
+
+    Returns:
+        a tuple with the decoded class indices of shape (N, SEQ_LEN), padded with -1, and the log-probabilities of the
+        decoded sequences of shape (N,)
+    """
+    num_samples, seq_len, num_classes = log_probs.shape
+    blank = num_classes - 1
+    num_chars = min(beam_width, blank)
+    log_probs = log_probs.astype(np.float64)
+
+    # Beams: scores of the prefix ending with a blank or not, last class, hash & lexicon state of the prefix
+    score_b = np.full((num_samples, beam_width), -np.inf)
+    score_b[:, 0] = 0
+    score_nb = np.full((num_samples, beam_width), -np.inf)
+    last = np.full((num_samples, beam_width), -1, dtype=np.int64)
+    hashes = np.zeros((num_samples, beam_width), dtype=np.uint64)
+    states = np.zeros((num_samples, beam_width), dtype=np.int64)
+    # Origin of the candidates: parent beam, and appended class (-1 for the same prefix)
+    cand_parents = np.concatenate([np.arange(beam_width), np.repeat(np.arange(beam_width), num_chars)])
+    cand_parents = np.broadcast_to(cand_parents, (num_samples, cand_parents.size))
+    parents, chars = [], []
+
+    for step in range(seq_len):
+        step_log_probs = log_probs[:, step]
+        total = np.logaddexp(score_b, score_nb)
+        # Same prefix: blank or repetition of the last class
+        same_b = total + step_log_probs[:, blank, None]
+        same_nb = score_nb + np.take_along_axis(step_log_probs, np.maximum(last, 0), axis=1)
+        same_nb[last < 0] = -np.inf
+        # Extensions with the most likely classes
+        top_chars = np.argpartition(-step_log_probs[:, :blank], num_chars - 1, axis=1)[:, :num_chars]
+        ext_chars = np.broadcast_to(top_chars[:, None], (num_samples, beam_width, num_chars))
+        # A repeated class is only a new character after a blank
+        ext_nb = np.where(ext_chars == last[..., None], score_b[..., None], total[..., None])
+        ext_nb = ext_nb + np.take_along_axis(step_log_probs, top_chars, axis=1)[:, None]
+        ext_hashes = hashes[..., None] * _HASH_BASE + (ext_chars + 1).astype(np.uint64)
+        if lexicon is None:
+            ext_states = np.broadcast_to(states[..., None], ext_chars.shape)
+        else:
+            ext_states = lexicon.step(np.broadcast_to(states[..., None], ext_chars.shape), ext_chars)
+            ext_nb = np.where(ext_states >= 0, ext_nb, -np.inf)
+
+        # Candidates of shape (N, beam_width * (1 + num_chars))
+        cand_b = np.concatenate([same_b, np.full((num_samples, beam_width * num_chars), -np.inf)], axis=1)
+        cand_nb = np.concatenate([same_nb, ext_nb.reshape(num_samples, -1)], axis=1)
+        cand_last = np.concatenate([last, ext_chars.reshape(num_samples, -1)], axis=1)
+        cand_hashes = np.concatenate([hashes, ext_hashes.reshape(num_samples, -1)], axis=1)
+        cand_states = np.concatenate([states, ext_states.reshape(num_samples, -1)], axis=1)
+        cand_chars = np.concatenate(
+            [np.full((num_samples, beam_width), -1), ext_chars.reshape(num_samples, -1)], axis=1
+        )
+        cand_hashes[np.isneginf(cand_b) & np.isneginf(cand_nb)] = _INVALID_HASH
+
+        # Merge identical prefixes
+        order = cand_hashes.argsort(axis=1, kind='stable')
+        cand_b, cand_nb, cand_hashes, cand_last, cand_states, cand_chars, _parents = (
+            np.take_along_axis(arr, order, axis=1)
+            for arr in (cand_b, cand_nb, cand_hashes, cand_last, cand_states, cand_chars, cand_parents)
+        )
+        is_first = np.ones(cand_hashes.shape, dtype=bool)
+        is_first[:, 1:] = cand_hashes[:, 1:] != cand_hashes[:, :-1]
+        first_idxs = np.flatnonzero(is_first)
+        flat_b = np.full(cand_b.size, -np.inf)
+        flat_b[first_idxs] = np.logaddexp.reduceat(cand_b.ravel(), first_idxs)
+        flat_nb = np.full(cand_nb.size, -np.inf)
+        flat_nb[first_idxs] = np.logaddexp.reduceat(cand_nb.ravel(), first_idxs)
+        merged_b, merged_nb = flat_b.reshape(cand_b.shape), flat_nb.reshape(cand_nb.shape)
+
+        # Keep the best prefixes
+        keep = np.argpartition(-np.logaddexp(merged_b, merged_nb), beam_width - 1, axis=1)[:, :beam_width]
+        score_b = np.take_along_axis(merged_b, keep, axis=1)
+        score_nb = np.take_along_axis(merged_nb, keep, axis=1)
+        hashes = np.take_along_axis(cand_hashes, keep, axis=1)
+        last = np.take_along_axis(cand_last, keep, axis=1)
+        states = np.take_along_axis(cand_states, keep, axis=1)
+        parents.append(np.take_along_axis(_parents, keep, axis=1))
+        chars.append(np.take_along_axis(cand_chars, keep, axis=1))
+
+    scores = np.logaddexp(score_b, score_nb)
+    if lexicon is not None:
+        accepted = (states >= 0) & lexicon.accepting[np.maximum(states, 0)] & np.isfinite(scores)
+        scores = np.where(accepted | ~accepted.any(axis=1, keepdims=True), scores, -np.inf)
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(num_samples), best]
+
+    # Backtrack the appended classes
+    labels = np.empty((num_samples, seq_len), dtype=np.int64)
+    beams = best
+    for step in range(seq_len - 1, -1, -1):
+        labels[:, step] = chars[step][np.arange(num_samples), beams]
+        beams = parents[step][np.arange(num_samples), beams]
+    # Move the steps without appended class to the end
+    labels = np.take_along_axis(labels, np.argsort(labels < 0, axis=1, kind='stable'), axis=1)
+
+    return labels, best_scores
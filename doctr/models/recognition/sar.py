@@ -4,6 +4,7 @@
 # See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
 
 from copy import deepcopy
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras import Sequential, layers
 from typing import Tuple, Dict, List, Any, Optional
@@ -64,10 +65,26 @@ class AttentionModule(layers.Layer, NestedObject):
         )
         self.flatten = layers.Flatten()
 
+    def project_features(
+        self,
+        features: tf.Tensor,
+        **kwargs: Any,
+    ) -> tf.Tensor:
+        """Project the feature maps of the encoder, which do not depend on the decoding step
+
+        Args:
+            features: feature maps of the encoder, of shape (N, H, W, C)
+
+        Returns:
+            the projected features, of shape (N, H, W, attention_units)
+        """
+        return self.features_projector(features, **kwargs)
+
     def call(
         self,
         features: tf.Tensor,
         hidden_state: tf.Tensor,
+        features_projection: Optional[tf.Tensor] = None,
         **kwargs: Any,
     ) -> tf.Tensor:
 
@@ -75,7 +92,8 @@ class AttentionModule(layers.Layer, NestedObject):
         # shape (N, 1, 1, rnn_units) -> (N, 1, 1, attention_units)
         hidden_state_projection = self.hidden_state_projector(hidden_state, **kwargs)
         # shape (N, H, W, vgg_units) -> (N, H, W, attention_units)
-        features_projection = self.features_projector(features, **kwargs)
+        if features_projection is None:
+            features_projection = self.project_features(features, **kwargs)
         projection = tf.math.tanh(hidden_state_projection + features_projection)
         # shape (N, H, W, attention_units) -> (N, H, W, 1)
         attention = self.attention_projector(projection, **kwargs)
@@ -100,6 +118,9 @@ class SARDecoder(layers.Layer, NestedObject):
         embedding_units: number of hidden embedding units
         attention_units: number of hidden attention units
         num_decoder_layers: number of LSTM layers to stack
+        early_exit: whether inference should stop as soon as all sequences of the batch have emitted <eos>
+        fused: whether inference should run the LSTM cells with a single matrix multiplication per layer, and
+            embed symbols with a lookup rather than a dense layer over their one-hot encoding
 
     """
     def __init__(
@@ -111,6 +132,8 @@ class SARDecoder(layers.Layer, NestedObject):
         attention_units: int,
         num_decoder_layers: int = 2,
         input_shape: Optional[List[Tuple[Optional[int]]]] = None,
+        early_exit: bool = False,
+        fused: bool = False,
     ) -> None:
 
         super().__init__()
@@ -122,11 +145,147 @@ class SARDecoder(layers.Layer, NestedObject):
         self.attention_module = AttentionModule(attention_units)
         self.output_dense = layers.Dense(vocab_size + 1, use_bias=True, input_shape=(None, 2 * rnn_units))
         self.max_length = max_length
+        self.early_exit = early_exit
+        self.fused = fused
 
         # Initialize kernels
         if input_shape is not None:
             self.attention_module.call(layers.Input(input_shape[0][1:]), layers.Input((1, 1, rnn_units)))
 
+    def _fused_weights(self) -> Tuple[tf.Tensor, List[Tuple[tf.Tensor, tf.Tensor]]]:
+        """Gather the weights of the embedding and the LSTM cells in their fused layout
+
+        Returns:
+            a tuple with the embedding table of shape (vocab_size + 2, embedding_units), where the virtual START
+            symbol is embedded as zeros like its out-of-range one-hot encoding, and for each LSTM cell, its input and
+            recurrent kernels stacked along the input axis along with its bias
+        """
+        if not self.embed.built:
+            self.embed.build((None, self.vocab_size + 1))
+        embedding = tf.pad(self.embed.kernel, [[0, 1], [0, 0]])
+        cell_weights = [
+            (tf.concat([cell.kernel, cell.recurrent_kernel], axis=0), cell.bias)
+            for cell in self.lstm_decoder.cells
+        ]
+        return embedding, cell_weights
+
+    def _fused_lstm(
+        self,
+        inputs: tf.Tensor,
+        states: List[List[tf.Tensor]],
+        cell_weights: List[Tuple[tf.Tensor, tf.Tensor]],
+    ) -> Tuple[tf.Tensor, List[List[tf.Tensor]]]:
+        """Run the stacked LSTM cells with a single matrix multiplication per cell
+
+        Args:
+            inputs: inputs of the first cell, of shape (N, C)
+            states: states of the LSTM cells
+            cell_weights: fused weights of the LSTM cells
+
+        Returns:
+            a tuple with the output of the last cell, of shape (N, rnn_units), and the updated states
+        """
+        new_states = []
+        for cell, (kernel, bias), (h, c) in zip(self.lstm_decoder.cells, cell_weights, states):
+            # Gates are ordered as input, forget, cell & output
+            z = tf.nn.bias_add(tf.matmul(tf.concat([inputs, h], axis=-1), kernel), bias)
+            z_i, z_f, z_c, z_o = tf.split(z, 4, axis=-1)
+            c = cell.recurrent_activation(z_f) * c + cell.recurrent_activation(z_i) * cell.activation(z_c)
+            inputs = cell.recurrent_activation(z_o) * cell.activation(c)
+            new_states.append([inputs, c])
+        return inputs, new_states
+
+    def _step(
+        self,
+        features: tf.Tensor,
+        symbol: tf.Tensor,
+        states: List[List[tf.Tensor]],
+        features_projection: Optional[tf.Tensor] = None,
+        fused_weights: Optional[Tuple[tf.Tensor, List[Tuple[tf.Tensor, tf.Tensor]]]] = None,
+        **kwargs: Any,
+    ) -> Tuple[tf.Tensor, List[List[tf.Tensor]]]:
+        """Run a single decoding step
+
+        Args:
+            features: feature maps of the encoder, of shape (N, H, W, C)
+            symbol: symbols predicted at the previous step, of shape (N,)
+            states: states of the LSTM cells
+            features_projection: features projected by the attention module, computed at each step if None
+            fused_weights: weights returned by `_fused_weights`, to run the fused implementation of the step
+
+        Returns:
+            a tuple with the logits of shape (N, vocab_size + 1), and the updated states
+        """
+        if fused_weights is None:
+            # one-hot symbol with depth vocab_size + 1
+            # embeded_symbol: shape (N, embedding_units)
+            embeded_symbol = self.embed(tf.one_hot(symbol, depth=self.vocab_size + 1), **kwargs)
+            logits, states = self.lstm_decoder(embeded_symbol, states, **kwargs)
+        else:
+            embeded_symbol = tf.gather(fused_weights[0], symbol)
+            logits, states = self._fused_lstm(embeded_symbol, states, fused_weights[1])
+        glimpse = self.attention_module(
+            features, tf.expand_dims(tf.expand_dims(logits, axis=1), axis=1), features_projection, **kwargs,
+        )
+        # logits: shape (N, rnn_units), glimpse: shape (N, 1)
+        logits = tf.concat([logits, glimpse], axis=-1)
+        # shape (N, rnn_units + 1) -> (N, vocab_size + 1)
+        logits = self.output_dense(logits, **kwargs)
+        return logits, states
+
+    def _decode_early_exit(
+        self,
+        features: tf.Tensor,
+        states: List[List[tf.Tensor]],
+        features_projection: tf.Tensor,
+        fused_weights: Optional[Tuple[tf.Tensor, List[Tuple[tf.Tensor, tf.Tensor]]]] = None,
+        **kwargs: Any,
+    ) -> tf.Tensor:
+        """Greedy decoding that stops once every sequence has emitted <eos>. The logits of the skipped steps
+        are filled with <eos> predictions, so that the output shape is unchanged.
+
+        Args:
+            features: feature maps of the encoder, of shape (N, H, W, C)
+            states: states of the LSTM cells after the holistic step
+            features_projection: features projected by the attention module
+            fused_weights: weights returned by `_fused_weights`, to run the fused implementation of the steps
+
+        Returns:
+            the logits, of shape (N, max_length + 1, vocab_size + 1)
+        """
+        batch_size = tf.shape(features)[0]
+        num_steps = self.max_length + 1  # keep 1 step for <eos>
+
+        def _cond(t, symbol, states, finished, logits_array):
+            return tf.logical_and(t < num_steps, tf.logical_not(tf.reduce_all(finished)))
+
+        def _body(t, symbol, states, finished, logits_array):
+            logits, _states = self._step(features, symbol, states, features_projection, fused_weights, **kwargs)
+            # The structure of the states must be kept across iterations
+            states = tf.nest.pack_sequence_as(states, tf.nest.flatten(_states))
+            symbol = tf.argmax(logits, axis=-1, output_type=tf.int32)
+            finished = tf.logical_or(finished, tf.equal(symbol, self.vocab_size))
+            return t + 1, symbol, states, finished, logits_array.write(t, logits)
+
+        # Initialize with the index of virtual START symbol (placed after <eos>)
+        loop_vars = (
+            tf.constant(0),
+            tf.fill([batch_size], self.vocab_size + 1),
+            states,
+            tf.zeros([batch_size], dtype=tf.bool),
+            tf.TensorArray(tf.float32, size=0, dynamic_size=True),
+        )
+        num_decoded, _, _, _, logits_array = tf.while_loop(_cond, _body, loop_vars, maximum_iterations=num_steps)
+
+        # shape (num_decoded, N, vocab_size + 1) -> (N, num_decoded, vocab_size + 1)
+        logits = tf.transpose(logits_array.stack(), perm=[1, 0, 2])
+        # Fill the skipped steps with <eos>
+        eos_logits = tf.one_hot(tf.fill([batch_size, num_steps - num_decoded], self.vocab_size), self.vocab_size + 1)
+        outputs = tf.concat([logits, eos_logits], axis=1)
+        outputs.set_shape([None, num_steps, self.vocab_size + 1])
+
+        return outputs
+
     def call(
         self,
         features: tf.Tensor,
@@ -139,24 +298,24 @@ class SARDecoder(layers.Layer, NestedObject):
         states = self.lstm_decoder.get_initial_state(
             inputs=None, batch_size=features.shape[0], dtype=tf.float32
         )
+        fused_weights = self._fused_weights() if self.fused and not kwargs.get('training') else None
         # run first step of lstm
         # holistic: shape (N, rnn_units)
-        _, states = self.lstm_decoder(holistic, states, **kwargs)
+        if fused_weights is None:
+            _, states = self.lstm_decoder(holistic, states, **kwargs)
+        else:
+            _, states = self._fused_lstm(holistic, states, fused_weights[1])
+        # The projection of the features is shared by all steps
+        features_projection = self.attention_module.project_features(features, **kwargs)
+
+        if self.early_exit and not kwargs.get('training'):
+            return self._decode_early_exit(features, states, features_projection, fused_weights, **kwargs)
+
         # Initialize with the index of virtual START symbol (placed after <eos>)
-        symbol = tf.fill(features.shape[0], self.vocab_size + 1)
+        symbol = tf.fill([features.shape[0]], self.vocab_size + 1)
         logits_list = []
         for t in range(self.max_length + 1):  # keep 1 step for <eos>
-            # one-hot symbol with depth vocab_size + 1
-            # embeded_symbol: shape (N, embedding_units)
-            embeded_symbol = self.embed(tf.one_hot(symbol, depth=self.vocab_size + 1), **kwargs)
-            logits, states = self.lstm_decoder(embeded_symbol, states, **kwargs)
-            glimpse = self.attention_module(
-                features, tf.expand_dims(tf.expand_dims(logits, axis=1), axis=1), **kwargs,
-            )
-            # logits: shape (N, rnn_units), glimpse: shape (N, 1)
-            logits = tf.concat([logits, glimpse], axis=-1)
-            # shape (N, rnn_units + 1) -> (N, vocab_size + 1)
-            logits = self.output_dense(logits, **kwargs)
+            logits, states = self._step(features, symbol, states, features_projection, fused_weights, **kwargs)
             # update symbol with predicted logits for t+1 step
             if kwargs.get('training'):
                 symbol = labels[:, t]
@@ -180,6 +339,8 @@ class SAR(RecognitionModel):
         attention_units: number of hidden units in attention module
         max_length: maximum word length handled by the model
         num_decoders: number of LSTM to stack in decoder layer
+        early_exit: whether inference should stop as soon as all words of the batch are complete
+        fused: whether inference should run the fused implementation of the decoder, which shares its weights
 
     """
 
@@ -194,6 +355,8 @@ class SAR(RecognitionModel):
         attention_units: int = 512,
         max_length: int = 30,
         num_decoders: int = 2,
+        early_exit: bool = False,
+        fused: bool = False,
         cfg: Optional[Dict[str, Any]] = None,
     ) -> None:
 
@@ -214,7 +377,8 @@ class SAR(RecognitionModel):
 
         self.decoder = SARDecoder(
             rnn_units, max_length, len(vocab), embedding_units, attention_units, num_decoders,
-            input_shape=[self.feat_extractor.output_shape, self.encoder.output_shape]
+            input_shape=[self.feat_extractor.output_shape, self.encoder.output_shape], early_exit=early_exit,
+            fused=fused,
         )
 
         self.postprocessor = SARPostProcessor(vocab=vocab)
@@ -280,10 +444,10 @@ class SARPostProcessor(RecognitionPostProcessor):
         ignore_accents: if True, ignore accents of letters
     """
 
-    def __call__(
+    def decode(
         self,
         logits: tf.Tensor,
-    ) -> List[str]:
+    ) -> Tuple[List[str], np.ndarray]:
         # compute pred with argmax for attention models
         pred = tf.math.argmax(logits, axis=2)
 
@@ -300,7 +464,13 @@ class SARPostProcessor(RecognitionPostProcessor):
         if self.ignore_accents:
             raise NotImplementedError
 
-        return words_list
+        # Confidence of the least likely step, up to the end of the sequence
+        _logits = logits.numpy() if isinstance(logits, tf.Tensor) else np.asarray(logits)
+        is_eos = pred.numpy() == len(self.vocab)
+        after_eos = np.cumsum(is_eos, axis=1) > is_eos
+        confidences = np.where(after_eos, 1, self._step_confidences(_logits)).min(axis=1)
+
+        return words_list, confidences
 
 
 def _sar(arch: str, pretrained: bool, input_shape: Tuple[int, int, int] = None, **kwargs: Any) -> SAR:
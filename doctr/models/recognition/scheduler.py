@@ -0,0 +1,151 @@
+# Copyright (C) 2021, Mindee.
+
+# This program is licensed under the Apache License version 2.
+# See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
+
+import time
+import numpy as np
+from concurrent.futures import Future
+from threading import Thread, Condition
+from typing import List, Any, Tuple, Optional, Union
+
+from .core import RecognitionPredictor
+from doctr.utils.repr import NestedObject
+
+__all__ = ['RecognitionScheduler']
+
+
+class RecognitionScheduler(NestedObject):
+    """Implements a recognition scheduler shared between concurrent callers: crops submitted by several threads
+    are gathered into full batches before being forwarded to the recognition predictor.
+
+    Example::
+        >>> from doctr.models import detection_predictor, recognition_predictor, OCRPredictor, RecognitionScheduler
+        >>> scheduler = RecognitionScheduler(recognition_predictor(pretrained=True), max_delay=0.01)
+        >>> model = OCRPredictor(detection_predictor(pretrained=True), scheduler)
+
+    Args:
+        predictor: the recognition predictor to schedule
+        batch_size: the number of crops to gather before running the predictor. Defaults to the batch size of the
+            predictor's preprocessor
+        max_delay: maximum time (in seconds) waited for other requests once a first request was submitted
+    """
+
+    _children_names: List[str] = ['predictor']
+
+    def __init__(
+        self,
+        predictor: RecognitionPredictor,
+        batch_size: Optional[int] = None,
+        max_delay: float = 0.005,
+    ) -> None:
+
+        self.predictor = predictor
+        self.batch_size = batch_size if isinstance(batch_size, int) else predictor.pre_processor.batch_size
+        self.max_delay = max_delay
+        self._requests: List[Tuple[Union[List[np.ndarray], np.ndarray], Future]] = []
+        self._num_crops = 0
+        self._condition = Condition()
+        self._worker: Optional[Thread] = None
+
+    def extra_repr(self) -> str:
+        return f"batch_size={self.batch_size}, max_delay={self.max_delay}"
+
+    def _collect(self) -> List[Tuple[Union[List[np.ndarray], np.ndarray], Future]]:
+        """Wait for enough crops to fill a batch, or for the maximum delay to expire
+
+        Returns:
+            the pending requests
+        """
+        with self._condition:
+            while len(self._requests) == 0:
+                self._condition.wait()
+            # Give other callers some time to fill the batch
+            deadline = time.monotonic() + self.max_delay
+            while self._num_crops < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            requests, self._requests, self._num_crops = self._requests, [], 0
+        return requests
+
+    def _run(self) -> None:
+        while True:
+            requests = self._collect()
+            crops = [crop for _crops, _ in requests for crop in _crops]
+            try:
+                char_sequences, confidences = self.predictor.predict(crops)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            # Send each caller its own results
+            crop_idx = 0
+            for _crops, future in requests:
+                future.set_result((
+                    char_sequences[crop_idx: crop_idx + len(_crops)],
+                    confidences[crop_idx: crop_idx + len(_crops)],
+                ))
+                crop_idx += len(_crops)
+
+    def submit(self, crops: Union[List[np.ndarray], np.ndarray]) -> Future:
+        """Submit crops for recognition without blocking
+
+        Args:
+            crops: list of crops (np.ndarray of shape H x W x C), or packed crops of shape (N, H, W, C)
+
+        Returns:
+            a future resolving to the list of recognized character sequences and their confidence scores
+        """
+        future: Future = Future()
+        if len(crops) == 0:
+            future.set_result(([], np.zeros(0, dtype=np.float32)))
+            return future
+        # Dimension check
+        if any(crop.ndim != 3 for crop in crops):
+            raise ValueError("incorrect input shape: all crops are expected to be multi-channel 2D images.")
+
+        with self._condition:
+            # Lazily start the worker
+            if self._worker is None:
+                self._worker = Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._requests.append((crops, future))
+            self._num_crops += len(crops)
+            self._condition.notify()
+
+        return future
+
+    def predict(
+        self,
+        crops: Union[List[np.ndarray], np.ndarray],
+        **kwargs: Any,
+    ) -> Tuple[List[str], np.ndarray]:
+        """Recognize character sequences in crops along with their confidence, sharing batches with concurrent
+        callers
+
+        Args:
+            crops: list of crops (np.ndarray of shape H x W x C), or packed crops of shape (N, H, W, C)
+            kwargs: ignored, since batches mix the crops of several callers
+
+        Returns:
+            a tuple with the list of recognized character sequences, and their confidence scores of shape (N,)
+        """
+        return self.submit(crops).result()
+
+    def __call__(
+        self,
+        crops: Union[List[np.ndarray], np.ndarray],
+        **kwargs: Any,
+    ) -> List[str]:
+        """Recognize character sequences in crops, sharing batches with concurrent callers
+
+        Args:
+            crops: list of crops (np.ndarray of shape H x W x C), or packed crops of shape (N, H, W, C)
+            kwargs: ignored, since batches mix the crops of several callers
+
+        Returns:
+            list of recognized character sequences
+        """
+        return self.predict(crops)[0]
@@ -18,7 +18,7 @@ default_cfgs: Dict[str, Dict[str, Any]] = {
 }
 
 
-def _predictor(arch: str, pretrained: bool, **kwargs: Any) -> RecognitionPredictor:
+def _predictor(arch: str, pretrained: bool, compiled: bool = False, **kwargs: Any) -> RecognitionPredictor:
 
     if default_cfgs.get(arch) is None:
         raise ValueError(f"unknown architecture '{arch}'")
@@ -29,7 +29,8 @@ def _predictor(arch: str, pretrained: bool, **kwargs: Any) -> RecognitionPredict
     predictor = RecognitionPredictor(
         RecognitionPreProcessor(output_size=_model.cfg['input_shape'][:2], **kwargs),
         _model,
-        recognition.__dict__[default_cfgs[arch]['post_processor']](_model.cfg['vocab'])
+        recognition.__dict__[default_cfgs[arch]['post_processor']](_model.cfg['vocab']),
+        compiled=compiled,
     )
 
     return predictor
@@ -48,6 +49,7 @@ def recognition_predictor(arch: str = 'crnn_vgg16_bn', pretrained: bool = False,
     Args:
         arch: name of the architecture to use ('crnn_vgg16_bn', 'crnn_resnet31', 'sar_vgg16_bn', 'sar_resnet31')
         pretrained: If True, returns a model pre-trained on our text recognition dataset
+        compiled: If True, the model is run in inference mode through graphs traced with fixed input shapes
 
     Returns:
         Recognition predictor
@@ -0,0 +1,92 @@
+# Copyright (C) 2021, Mindee.
+
+# This program is licensed under the Apache License version 2.
+# See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
+
+import os
+import time
+import numpy as np
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+import tensorflow as tf
+from doctr.models import recognition
+from doctr.datasets import VOCABS
+
+
+def synthetic_logits(words, vocab, seq_len, confusion, rng):
+    """Generate CTC logits aligned with the given words, where some characters are confused with others"""
+    blank = len(vocab)
+    logits = rng.normal(0, 1, (len(words), seq_len, len(vocab) + 1)).astype(np.float32)
+    logits[..., blank] += 6
+    for idx, word in enumerate(words):
+        # Spread the characters over the sequence, separated by blanks
+        steps = np.linspace(0, seq_len - 1, 2 * len(word) + 1).round().astype(int)[1::2]
+        for step, char in zip(steps, word):
+            logits[idx, step, blank] -= 6
+            logits[idx, step, vocab.index(char)] += 6
+            # Ambiguous character
+            if rng.random() < confusion:
+                logits[idx, step, rng.integers(0, blank)] += 6 + rng.normal(0, 1)
+    return logits
+
+
+def random_field(rng):
+    """Generate an invoice-like field: a date or a product code"""
+    if rng.random() < 0.5:
+        return f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/{rng.integers(1990, 2030)}"
+    return ''.join(rng.choice(list("ABCDEFGHJKLMNPRSTUVWXYZ"), 3)) + '-' + ''.join(rng.choice(list("0123456789"), 5))
+
+
+def main(args):
+
+    rng = np.random.default_rng(args.seed)
+    vocab = VOCABS['french']
+    words = [random_field(rng) for _ in range(args.crops)]
+    logits = synthetic_logits(words, vocab, args.seq_len, args.confusion, rng)
+    lexicon = recognition.Lexicon(vocab, patterns=[r"\d{2}/\d{2}/\d{4}", r"[A-Z]{3}-\d{5}"])
+
+    decoders = {
+        'greedy (tensorflow)': recognition.CTCPostProcessor(vocab, backend='tensorflow'),
+        'greedy (numpy)': recognition.CTCPostProcessor(vocab),
+        f'beam search {args.beam_width} (tensorflow)': recognition.CTCPostProcessor(
+            vocab, backend='tensorflow', beam_width=args.beam_width
+        ),
+        f'beam search {args.beam_width} (numpy)': recognition.CTCPostProcessor(vocab, beam_width=args.beam_width),
+        f'beam search {args.beam_width} + lexicon (numpy)': recognition.CTCPostProcessor(
+            vocab, beam_width=args.beam_width, lexicon=lexicon
+        ),
+    }
+
+    print(f"CTC decoding benchmark ({args.crops} crops, sequence length={args.seq_len}, confusion={args.confusion})")
+    for name, decoder in decoders.items():
+        latencies, predictions = [], []
+        for start_idx in range(0, args.crops, args.batch_size):
+            batch = tf.constant(logits[start_idx: start_idx + args.batch_size])
+            start_ts = time.perf_counter()
+            predictions.extend(decoder(batch))
+            latencies.append(time.perf_counter() - start_ts)
+        accuracy = np.mean([pred == word for pred, word in zip(predictions, words)])
+        latency = sum(latencies) / args.crops
+        print(f"{name}: {1e6 * latency:.0f}us per crop (exact match: {100 * accuracy:.1f}%)")
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='DocTR CTC decoding benchmark',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--crops', type=int, default=1024, help='Number of crops')
+    parser.add_argument('--batch-size', type=int, default=64, help='Number of crops per batch')
+    parser.add_argument('--seq-len', type=int, default=32, help='Length of the CTC sequences')
+    parser.add_argument('--confusion', type=float, default=0.1, help='Probability of an ambiguous character')
+    parser.add_argument('--beam-width', type=int, default=10, help='Beam width')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,113 @@
+# Copyright (C) 2021, Mindee.
+
+# This program is licensed under the Apache License version 2.
+# See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
+
+import os
+import time
+import numpy as np
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+from doctr.models import DocumentBuilder
+
+
+def synthetic_page(num_words, rng, num_cols=12):
+    """Generate the relative word boxes of a spreadsheet-like page, with slightly misaligned rows and columns"""
+    num_rows = -(-num_words // num_cols)
+    row_height = 1 / num_rows
+    col_width = 1 / num_cols
+    cells = rng.permutation(num_rows * num_cols)[:num_words]
+    rows, cols = cells // num_cols, cells % num_cols
+    x1 = cols * col_width + rng.uniform(0, 0.3, num_words) * col_width
+    y1 = rows * row_height + rng.uniform(0, 0.2, num_words) * row_height
+    x2 = x1 + rng.uniform(0.2, 0.6, num_words) * col_width
+    y2 = y1 + rng.uniform(0.5, 0.7, num_words) * row_height
+    return np.stack((x1, y1, x2, y2), axis=1).astype(np.float32)
+
+
+def reference_resolve_lines(boxes, paragraph_break):
+    """Word-by-word line resolution, as implemented before the vectorized sweep"""
+    y_med = np.median(boxes[:, 3] - boxes[:, 1])
+    idxs = (boxes[:, 0] + 2 * boxes[:, 3] / y_med).argsort()
+
+    def resolve_sub_lines(words):
+        lines = []
+        words = [words[j] for j in np.argsort([boxes[i, 0] for i in words]).tolist()]
+        sub_line = [words[0]]
+        for i in words[1:]:
+            if not (boxes[i, 0] - boxes[sub_line[-1]][2]) < paragraph_break:
+                lines.append(sub_line)
+                sub_line = []
+            sub_line.append(i)
+        lines.append(sub_line)
+        return lines
+
+    lines = []
+    words = [idxs[0]]
+    y_center_sum = boxes[idxs[0]][[1, 3]].mean()
+    for idx in idxs[1:]:
+        if not abs(boxes[idx][[1, 3]].mean() - y_center_sum / len(words)) < y_med / 2:
+            lines.extend(resolve_sub_lines(words))
+            words = []
+            y_center_sum = 0
+        words.append(idx)
+        y_center_sum += boxes[idx][[1, 3]].mean()
+    lines.extend(resolve_sub_lines(words))
+
+    return [[int(idx) for idx in line] for line in lines]
+
+
+def main(args):
+
+    rng = np.random.default_rng(args.seed)
+    doc_builder = DocumentBuilder(resolve_lines=True)
+
+    print(f"Line resolution benchmark ({args.it} iterations)")
+    for num_words in args.words:
+        boxes = synthetic_page(num_words, rng)
+        engines = {
+            'word by word': lambda: reference_resolve_lines(boxes, doc_builder.paragraph_break),
+            'vectorized': lambda: doc_builder._resolve_lines(boxes),
+        }
+        lines = {}
+        for name, engine in engines.items():
+            start_ts = time.perf_counter()
+            for _ in range(args.it):
+                lines[name] = engine()
+            latency = (time.perf_counter() - start_ts) / args.it
+            print(f"{num_words} words - {name}: {1000 * latency:.1f}ms ({len(lines[name])} lines)")
+        print(f"{num_words} words - identical lines: {lines['word by word'] == lines['vectorized']}")
+
+    print(f"Block resolution benchmark ({args.it} iterations)")
+    for num_words in args.words:
+        boxes = synthetic_page(num_words, rng)
+        lines = doc_builder._resolve_lines(boxes)
+        blocks = {}
+        for block_clustering in ('hierarchical', 'spatial'):
+            doc_builder.block_clustering = block_clustering
+            start_ts = time.perf_counter()
+            for _ in range(args.it):
+                blocks[block_clustering] = doc_builder._resolve_blocks(boxes, lines)
+            latency = (time.perf_counter() - start_ts) / args.it
+            print(f"{len(lines)} lines - {block_clustering}: {1000 * latency:.1f}ms "
+                  f"({len(blocks[block_clustering])} blocks)")
+        print(f"{len(lines)} lines - identical blocks: {blocks['hierarchical'] == blocks['spatial']}")
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='DocTR layout resolution benchmark',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--words', type=int, nargs='+', default=[100, 1000, 5000], help='Number of words per page')
+    parser.add_argument('--it', type=int, default=10, help='Number of iterations')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
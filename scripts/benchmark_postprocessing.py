@@ -0,0 +1,78 @@
+# Copyright (C) 2021, Mindee.
+
+# This program is licensed under the Apache License version 2.
+# See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
+
+import os
+import time
+import numpy as np
+import cv2
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+from doctr.models import detection
+
+
+def synthetic_proba_map(num_words, size, rng):
+    """Generate a probability map with word-like rectangles"""
+    proba_map = rng.uniform(0, 0.2, (size, size)).astype(np.float32)
+    for _ in range(num_words):
+        x, y = rng.integers(0, size - 60), rng.integers(0, size - 15)
+        w, h = rng.integers(8, 60), rng.integers(5, 14)
+        proba_map[y: y + h, x: x + w] = rng.uniform(0.6, 1.0)
+    return proba_map
+
+
+def box_iou(boxes_1, boxes_2):
+    """Pairwise IoU between two sets of relative boxes"""
+    left = np.maximum(boxes_1[:, None, :2], boxes_2[None, :, :2])
+    right = np.minimum(boxes_1[:, None, 2:4], boxes_2[None, :, 2:4])
+    inter = np.prod(np.clip(right - left, 0, None), axis=-1)
+    area_1 = np.prod(boxes_1[:, 2:4] - boxes_1[:, :2], axis=-1)
+    area_2 = np.prod(boxes_2[:, 2:4] - boxes_2[:, :2], axis=-1)
+    return inter / (area_1[:, None] + area_2[None] - inter)
+
+
+def main(args):
+
+    rng = np.random.default_rng(args.seed)
+    postprocessors = {
+        'contours': detection.DBPostProcessor(),
+        'vectorized': detection.DBPostProcessor(vectorized=True),
+    }
+    kernel = np.ones((1 + int(args.size / 512),) * 2, np.uint8)
+
+    print(f"DB post-processing benchmark (page size={args.size}, {args.it} iterations)")
+    for num_words in args.words:
+        proba_map = synthetic_proba_map(num_words, args.size, rng)
+        bitmap = cv2.morphologyEx((proba_map > args.bin_thresh).astype(np.float32), cv2.MORPH_OPEN, kernel)
+        boxes = {}
+        for name, postprocessor in postprocessors.items():
+            start_ts = time.perf_counter()
+            for _ in range(args.it):
+                boxes[name] = postprocessor.bitmap_to_boxes(proba_map, bitmap)
+            latency = (time.perf_counter() - start_ts) / args.it
+            print(f"{num_words} words - {name}: {1000 * latency:.1f}ms ({boxes[name].shape[0]} boxes)")
+        if boxes['contours'].shape[0] > 0 and boxes['vectorized'].shape[0] > 0:
+            mean_iou = box_iou(boxes['contours'], boxes['vectorized']).max(axis=1).mean()
+            print(f"{num_words} words - mean IoU between both engines: {mean_iou:.3f}")
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='DocTR post-processing benchmark',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--words', type=int, nargs='+', default=[100, 1000], help='Number of words per page')
+    parser.add_argument('--size', type=int, default=1024, help='Size of the probability maps')
+    parser.add_argument('--bin-thresh', type=float, default=0.3, help='Binarization threshold')
+    parser.add_argument('--it', type=int, default=20, help='Number of iterations per measurement')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,85 @@
+# Copyright (C) 2021, Mindee.
+
+# This program is licensed under the Apache License version 2.
+# See LICENSE or go to <https://www.apache.org/licenses/LICENSE-2.0.txt> for full license details.
+
+import os
+import time
+import numpy as np
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+import tensorflow as tf
+from doctr.models import recognition
+
+
+def timeit(fn, it):
+    """Average latency of a function, after a warmup call"""
+    fn()
+    start_ts = time.perf_counter()
+    for _ in range(it):
+        fn()
+    return (time.perf_counter() - start_ts) / it
+
+
+def main(args):
+
+    model = recognition.__dict__[args.arch](input_shape=(args.height, args.width, 3))
+    decoder = model.decoder
+    input_tensor = tf.random.uniform(shape=[args.batch_size, args.height, args.width, 3], minval=0, maxval=1)
+    features = model.feat_extractor(input_tensor, training=False)
+    hidden_state = tf.random.uniform(shape=[args.batch_size, 1, 1, decoder.lstm_decoder.cells[0].units])
+    features_projection = decoder.attention_module.project_features(features)
+
+    steps = {
+        'per-step projection': lambda: decoder.attention_module(features, hidden_state),
+        'cached projection': lambda: decoder.attention_module(features, hidden_state, features_projection),
+    }
+
+    print(f"SAR attention step benchmark ({args.arch}, batch size={args.batch_size}, features={features.shape})")
+    glimpses = {}
+    for name, step in steps.items():
+        latency = timeit(step, args.it)
+        glimpses[name] = step().numpy()
+        print(f"{name}: {1000 * latency:.2f}ms per step")
+    max_diff = np.abs(glimpses['per-step projection'] - glimpses['cached projection']).max()
+    print(f"max absolute difference between glimpses: {max_diff:.2e}")
+    # One projection per batch, shared by the max_length + 1 decoding steps
+    latency = timeit(lambda: decoder.attention_module.project_features(features), args.it)
+    print(f"projection of the features: {1000 * latency:.2f}ms per batch ({decoder.max_length + 1} steps)")
+
+    # Whole decoder, from the encoder outputs
+    pooled_features = tf.reduce_max(features, axis=1)
+    encoded = model.encoder(pooled_features, training=False)
+    print(f"SAR decoder benchmark ({args.arch}, batch size={args.batch_size})")
+    logits = {}
+    for fused in (False, True):
+        decoder.fused = fused
+        name = 'fused' if fused else 'keras cells'
+        decode = lambda x, y: decoder(x, y, training=False)  # noqa: E731
+        for mode, fn in (('eager', decode), ('graph', tf.function(decode))):
+            latency = timeit(lambda: fn(features, encoded), args.it)
+            print(f"{name} ({mode}): {1000 * latency:.1f}ms per batch")
+        logits[name] = decode(features, encoded).numpy()
+    max_diff = np.abs(logits['keras cells'] - logits['fused']).max()
+    print(f"max absolute difference between logits: {max_diff:.2e}")
+
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='DocTR SAR decoding benchmark',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--arch', type=str, default='sar_vgg16_bn', help='SAR architecture')
+    parser.add_argument('--batch-size', type=int, default=64, help='Number of crops per batch')
+    parser.add_argument('--height', type=int, default=32, help='Height of the crops')
+    parser.add_argument('--width', type=int, default=128, help='Width of the crops')
+    parser.add_argument('--it', type=int, default=20, help='Number of iterations')
+    args = parser.parse_args()
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
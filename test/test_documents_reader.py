@@ -2,9 +2,10 @@ import requests
 import pytest
 import fitz
 import numpy as np
+import cv2
 from io import BytesIO
 
-from doctr.documents import reader
+from doctr.documents import reader, Page
 
 
 def test_convert_page_to_numpy(mock_pdf):
@@ -18,6 +19,12 @@ def test_convert_page_to_numpy(mock_pdf):
     bgr_page = reader.convert_page_to_numpy(pdf[0], default_scales=(1, 1), rgb_output=False)
     assert np.all(bgr_page == rgb_page[..., ::-1])
 
+    # Check grayscale rendering
+    gray_page = reader.convert_page_to_numpy(pdf[0], default_scales=(1, 1), grayscale=True)
+    assert gray_page.shape == (792, 612, 1) and gray_page.dtype == np.uint8
+    # Pages can be modified in place, whatever the output mode
+    assert all(page.flags.writeable for page in (rgb_page, bgr_page, gray_page))
+
     # Check resizing
     resized_page = reader.convert_page_to_numpy(pdf[0], output_size=(396, 306))
     assert resized_page.shape == (396, 306, 3)
@@ -27,6 +34,11 @@ def test_convert_page_to_numpy(mock_pdf):
     assert isinstance(rgb_page, np.ndarray)
     assert rgb_page.shape == (1584, 1224, 3)
 
+    # Check adaptive rescaling
+    for target_size, shape in [((1024, 1024), (1326, 1024)), ((512, 1024), (1326, 1024)), ((1024, 256), (1024, 792))]:
+        assert reader.convert_page_to_numpy(pdf[0], target_size=target_size).shape[:2] == shape
+        assert reader.get_page_shape(pdf[0], target_size=target_size) == shape
+
 
 def _check_doc_content(doc_tensors, num_pages):
     # 1 doc of 8 pages
@@ -72,7 +84,8 @@ def test_read_img(tmpdir_factory, mock_pdf):
 
     # Path & stream
     with open(tmp_path, 'rb') as f:
-        page_stream = reader.read_img(f.read())
+        page_stream_bytes = f.read()
+    page_stream = reader.read_img(page_stream_bytes)
 
     for page in (reader.read_img(tmp_path), page_stream):
         # Data type
@@ -90,6 +103,16 @@ def test_read_img(tmpdir_factory, mock_pdf):
     resized_page = reader.read_img(tmp_path, target_size)
     assert resized_page.shape[:2] == target_size
 
+    # Reduced JPEG decoding
+    assert reader._get_jpeg_shape(page_stream_bytes) == (606, 517)
+    for file in (tmp_path, page_stream_bytes):
+        reduced_page = reader.read_img(file, target_size, reduced_decoding=True)
+        assert reduced_page.shape[:2] == target_size
+        assert np.abs(reduced_page.astype(np.int32) - resized_page).mean() < 8
+    # Truncated JPEG
+    with pytest.raises(ValueError):
+        reader.read_img(page_stream_bytes[:100], target_size, reduced_decoding=True)
+
 
 def test_read_html():
     url = "https://www.google.com"
@@ -101,6 +124,13 @@ def test_document_file(mock_pdf, mock_image_stream):
     pages = reader.DocumentFile.from_images(mock_image_stream)
     _check_doc_content(pages, 1)
 
+    # Multithreaded & lazy decoding
+    pages = reader.DocumentFile.from_images([mock_image_stream] * 5, workers=2)
+    _check_doc_content(pages, 5)
+    assert all(np.all(page == pages[0]) for page in pages)
+    pages = reader.DocumentFile.iter_images(iter([mock_image_stream] * 3), workers=2, output_size=(256, 128))
+    assert all(page.shape == (256, 128, 3) for page in pages)
+
     assert isinstance(reader.DocumentFile.from_pdf(mock_pdf).doc, fitz.Document)
     assert isinstance(reader.DocumentFile.from_url("https://www.google.com").doc, fitz.Document)
 
@@ -120,9 +150,108 @@ def test_pdf(mock_pdf):
                for page_words in words for (bbox, value) in page_words)
     assert all(all(isinstance(coord, float) for coord in bbox) for page_words in words for (bbox, value) in page_words)
 
+    # Rendering of page regions
+    crops = doc.get_page_crops(0, np.array([[0, 0, .5, .25], [.5, .5, .5, .5]], dtype=np.float32), scale=2)
+    _check_doc_content(crops, 2)
+    assert np.all(crops[0] == pages[0][:crops[0].shape[0], :crops[0].shape[1]])
+    assert crops[0].shape == (396, 612, 3) and crops[1].shape == (1, 1, 3)
+    assert all(crop.flags.writeable for crop in crops)
+
+    # Page elements from the text layer
+    page = doc.get_page_elements(0)
+    assert isinstance(page, Page) and page.dimensions == pages[0].shape[:2]
+    assert [word.value for block in page.blocks for line in block.lines for word in line.words] == \
+        [value for _, value in words[0]]
+    assert all(0 <= coord <= 1 for block in page.blocks for line in block.lines for word in line.words
+               for point in word.geometry for coord in point)
+
     # Get artefacts
     artefacts = doc.get_artefacts()
     assert isinstance(artefacts, list) and len(artefacts) == 8
     assert all(isinstance(bbox, tuple) for page_artefacts in artefacts for bbox in page_artefacts)
     assert all(all(isinstance(coord, float) for coord in bbox)
                for page_artefacts in artefacts for bbox in page_artefacts)
+
+
+def test_pdf_lazy(mock_pdf):
+
+    doc = reader.DocumentFile.from_pdf(mock_pdf)
+    pages = doc.as_images()
+    assert len(doc) == 8
+
+    # Indexing & slicing
+    assert np.all(doc[1] == pages[1]) and np.all(doc[-1] == pages[-1])
+    with pytest.raises(IndexError):
+        doc[8]
+    _check_doc_content(doc[2:5], 3)
+    assert all(np.all(page == ref) for page, ref in zip(doc[2:5], pages[2:5]))
+
+    # Multi-process rendering
+    for file in (mock_pdf, open(mock_pdf, 'rb').read()):
+        parallel_pages = reader.DocumentFile.from_pdf(file, workers=3).as_images()
+        _check_doc_content(parallel_pages, 8)
+        assert all(np.all(page == ref) for page, ref in zip(parallel_pages, pages))
+        assert all(page.flags.writeable for page in parallel_pages)
+    # Keyword arguments of read_pdf are passed on to the rendering processes
+    parallel_doc = reader.DocumentFile.from_pdf(mock_pdf, workers=2, fontsize=11)
+    assert parallel_doc.read_kwargs == {'fontsize': 11}
+    _check_doc_content(parallel_doc.as_images(), 8)
+
+    # Lazy iteration, with & without prefetching
+    for prefetch in (0, 2):
+        _check_doc_content(list(doc.iter_images(prefetch=prefetch)), 8)
+        assert all(np.all(page == ref) for page, ref in zip(doc.iter_images(prefetch=prefetch), pages))
+    assert all(np.all(page == ref) for page, ref in zip(doc, pages))
+    iterator = doc.iter_images([3, 1], prefetch=1, output_size=(396, 306))
+    assert next(iterator).shape == (396, 306, 3)
+    # Early stop
+    iterator.close()
+
+
+def test_tiff(tmpdir_factory, mock_pdf):
+
+    frames = [np.random.randint(0, 255, (300 + 10 * idx, 200, 3), dtype=np.uint8) for idx in range(4)]
+    tmp_path = str(tmpdir_factory.mktemp("data").join("mock_fax.tiff"))
+    assert cv2.imwritemulti(tmp_path, frames)
+
+    # Wrong input type
+    with pytest.raises(TypeError):
+        reader.DocumentFile.from_tiff(123)
+    # Invalid file
+    with pytest.raises(ValueError):
+        reader.DocumentFile.from_tiff(str(mock_pdf))
+
+    for file in (tmp_path, open(tmp_path, 'rb').read()):
+        doc = reader.DocumentFile.from_tiff(file)
+        assert len(doc) == 4
+        _check_doc_content(doc.as_images(), 4)
+        assert all(np.all(page == frame[..., ::-1]) for page, frame in zip(doc, frames))
+        assert doc[-1].shape == (330, 200, 3) and len(doc[1:3]) == 2
+        with pytest.raises(IndexError):
+            doc[4]
+        assert all(page.shape == (64, 32, 3) for page in doc.iter_images(prefetch=2, output_size=(64, 32)))
+
+
+def test_raster(tmpdir_factory):
+
+    raster = np.random.randint(0, 255, (400, 300, 3), dtype=np.uint8)
+    tmp_path = str(tmpdir_factory.mktemp("data").join("mock_scan.raw"))
+    raster.tofile(tmp_path)
+
+    mapped = reader.DocumentFile.from_raster(tmp_path, (400, 300, 3))
+    assert isinstance(mapped, np.memmap) and np.all(mapped == raster)
+    # The mapped raster is passed through when no conversion is required
+    assert reader.read_img(mapped) is mapped
+    assert np.all(reader.read_img(mapped, rgb_output=False) == raster[..., ::-1])
+    pages = reader.DocumentFile.from_images(mapped, output_size=(100, 80))
+    assert len(pages) == 1 and pages[0].shape == (100, 80, 3)
+
+    # Single-channel raster
+    gray = reader.DocumentFile.from_raster(tmp_path, (400, 300), offset=10)
+    page = reader.read_img(gray)
+    assert page.shape == (400, 300, 3) and np.all(page[..., 0] == raster.ravel()[10: 10 + 400 * 300].reshape(400, 300))
+
+    with pytest.raises(ValueError):
+        reader.DocumentFile.from_raster(tmp_path, (400, 300, 2))
+    with pytest.raises(ValueError):
+        reader.read_img(np.zeros((400, 300, 3), dtype=np.float32))
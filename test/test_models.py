@@ -1,9 +1,13 @@
 import pytest
+import cv2
 import numpy as np
+from functools import partial
+from queue import Queue
+from threading import Event
 import tensorflow as tf
 
 from doctr import models
-from doctr.documents import Document, DocumentFile
+from doctr.documents import Document, Page, DocumentFile
 from test_models_detection import test_detectionpredictor
 from test_models_recognition import test_recognitionpredictor
 
@@ -37,6 +41,27 @@ def test_extract_crops(mock_pdf):  # noqa: F811
     assert models.extract_crops(doc_img, np.zeros((0, 4))) == []
 
 
+def test_extract_packed_crops(mock_pdf):  # noqa: F811
+    pages = DocumentFile.from_pdf(mock_pdf).as_images()[:2]
+    boxes = [np.array([[0, 0, 0.5, 0.5], [0.5, 0.5, 1, 1]], dtype=np.float32), np.zeros((0, 4), dtype=np.float32)]
+    pre_processor = models.RecognitionPreProcessor(output_size=(32, 128), batch_size=4, backend='opencv')
+
+    crops, offsets = models.extract_packed_crops(pages, boxes, pre_processor)
+    assert isinstance(crops, np.ndarray) and crops.shape == (2, 32, 128, 3) and crops.dtype == np.uint8
+    assert offsets.tolist() == [0, 2, 2]
+    # Same samples as when preprocessing the crops
+    ref = pre_processor.normalize(pre_processor.pack_inputs(models.extract_crops(pages[0], boxes[0])))
+    assert np.allclose(pre_processor(crops)[0].numpy(), ref.numpy())
+
+    # No box
+    crops, offsets = models.extract_packed_crops(pages, [np.zeros((0, 4))] * 2, pre_processor)
+    assert crops.shape == (0, 32, 128, 3) and offsets.tolist() == [0, 0, 0]
+
+    # Packed crops of the wrong size
+    with pytest.raises(ValueError):
+        pre_processor(np.zeros((2, 32, 64, 3), dtype=np.uint8))
+
+
 def test_documentbuilder():
 
     words_per_page = 10
@@ -101,6 +126,55 @@ def test_resolve_lines(input_boxes, lines):
     assert doc_builder._resolve_lines(np.asarray(input_boxes)) == lines
 
 
+def test_resolve_lines_dense():
+    # Lines longer than the search window of line breaks
+    num_words = 50
+    x1 = np.linspace(0, 0.98, num_words)
+    boxes = np.concatenate([
+        np.stack((x1, np.full(num_words, y1), x1 + 0.015, np.full(num_words, y1 + 0.02)), axis=1)
+        for y1 in (0.1, 0.13, 0.5)
+    ])
+    boxes[num_words // 2, [1, 3]] += 0.005
+    doc_builder = models.DocumentBuilder()
+    lines = doc_builder._resolve_lines(boxes)
+    assert lines == [list(range(idx, idx + num_words)) for idx in range(0, 3 * num_words, num_words)]
+    # Horizontal split
+    boxes[num_words:, [0, 2]] += 0.05 * (np.arange(2 * num_words) % num_words >= 40)[:, None]
+    assert len(doc_builder._resolve_lines(boxes)) == 5
+
+
+def test_resolve_blocks():
+
+    boxes = np.random.rand(200, 4)
+    boxes[:, 2:] = boxes[:, :2] + 0.05 * boxes[:, 2:]
+    doc_builder = models.DocumentBuilder()
+    lines = doc_builder._resolve_lines(boxes)
+    blocks = doc_builder._resolve_blocks(boxes, lines)
+    assert sorted(idx for block in blocks for line in block for idx in line) == list(range(200))
+    # Same blocks with the spatial index
+    doc_builder = models.DocumentBuilder(block_clustering='spatial')
+    assert doc_builder._resolve_blocks(boxes, lines) == blocks
+    # Distant lines
+    assert len(doc_builder._resolve_blocks(np.asarray([[0, 0, 0.1, 0.05], [0.5, 0.5, 0.6, 0.55]]), [[0], [1]])) == 2
+
+    with pytest.raises(ValueError):
+        models.DocumentBuilder(block_clustering='dbscan')
+
+
+def test_consume_groups():
+
+    queue, stop_event = Queue(), Event()
+    for item in ([1, 2], [3], [4, 5, 6], [7]):
+        queue.put(item)
+    queue.put(models.core._SENTINEL)
+    # Queued items are gathered until their cumulated size reaches the maximum
+    assert list(models.core._consume_groups(queue, stop_event, len, 3)) == [[[1, 2], [3]], [[4, 5, 6]], [[7]]]
+    # Errors of the producer
+    queue.put(ValueError())
+    with pytest.raises(ValueError):
+        list(models.core._consume_groups(queue, stop_event, len, 3))
+
+
 def test_ocrpredictor(mock_pdf, test_detectionpredictor, test_recognitionpredictor):  # noqa: F811
 
     predictor = models.OCRPredictor(
@@ -115,11 +189,55 @@ def test_ocrpredictor(mock_pdf, test_detectionpredictor, test_recognitionpredict
     assert isinstance(out, Document)
     # The input PDF has 8 pages
     assert len(out.pages) == 8
+    # Word confidences combine detection & recognition
+    assert all(0 <= word.confidence <= 1 for page in out.pages for block in page.blocks for line in block.lines
+               for word in line.words)
     # Dimension check
     with pytest.raises(ValueError):
         input_page = (255 * np.random.rand(1, 256, 512, 3)).astype(np.uint8)
         _ = predictor([input_page])
 
+    # Crops from higher resolution sources
+    sources = [cv2.resize(page, None, fx=2, fy=2) for page in doc]
+    pdf = DocumentFile.from_pdf(mock_pdf)
+    for crop_sources in (sources, [partial(pdf.get_page_crops, idx, scale=4) for idx in range(8)]):
+        _out = predictor(doc, crop_sources)
+        assert len(_out.pages) == 8
+        assert [page.dimensions for page in _out.pages] == [page.dimensions for page in out.pages]
+    with pytest.raises(ValueError):
+        predictor(doc, sources[:2])
+
+    # Streaming
+    streamed_pages = list(predictor.stream(iter(doc)))
+    assert len(streamed_pages) == 8
+    assert all(isinstance(page, Page) for page in streamed_pages)
+    assert [page.page_idx for page in streamed_pages] == list(range(8))
+    assert all(streamed.render() == page.render() for streamed, page in zip(streamed_pages, out.pages))
+    # Early stop
+    stream = predictor.stream(doc, queue_size=1)
+    assert isinstance(next(stream), Page)
+    stream.close()
+    # Errors are raised in the calling thread
+    with pytest.raises(ValueError):
+        input_page = (255 * np.random.rand(1, 256, 512, 3)).astype(np.uint8)
+        _ = list(predictor.stream([input_page]))
+
+    # Born-digital fast path
+    pdf = DocumentFile.from_pdf(mock_pdf)
+    out = predictor.process_pdf(pdf)
+    assert isinstance(out, Document) and len(out.pages) == 8
+    assert [page.page_idx for page in out.pages] == list(range(8))
+    # Pages are built from the text layer
+    text_page = pdf.get_page_elements(0)
+    assert out.pages[0].render().startswith(text_page.render())
+    assert all(word.confidence == 1 for block in text_page.blocks for line in block.lines for word in line.words)
+    # Without text layer, all pages are processed by the models
+    out = predictor.process_pdf(pdf, min_words=1e6)
+    assert [page.dimensions for page in out.pages] == [page.shape[:2] for page in doc]
+    # High resolution crops
+    out = predictor.process_pdf(pdf, min_words=1e6, adaptive_scale=False, reco_scale=3)
+    assert len(out.pages) == 8
+
 
 @pytest.mark.parametrize(
     "det_arch, reco_arch",
@@ -145,3 +263,11 @@ def test_preprocessor():
     for batch in preprocessed:
         assert batch.shape[0] == 2
         assert batch.shape[1] == batch.shape[2] == 1024
+
+    # Packed inputs are resized by the threads of the preprocessor, or in the calling thread for small batches
+    pre_processor = models.recognition.RecognitionPreProcessor(output_size=(32, 128), batch_size=8, backend='opencv')
+    crops = [(255 * np.random.rand(16 + idx, 40 + 3 * idx, 3)).astype(np.uint8) for idx in range(40)]
+    ref = np.stack([pre_processor.pack_inputs([crop])[0] for crop in crops])
+    pre_processor._workers = 4
+    assert np.array_equal(pre_processor.pack_inputs(crops), ref)
+    assert np.array_equal(pre_processor.pack_inputs(crops[:5]), ref[:5])
@@ -34,6 +34,35 @@ def test_detpreprocessor(mock_pdf):  # noqa: F811
     # Repr
     assert repr(processor) == 'DetectionPreProcessor(output_size=(512, 512), mean=[0.5 0.5 0.5], std=[1. 1. 1.])'
 
+    # OpenCV backend
+    cv2_processor = detection.DetectionPreProcessor(output_size=(512, 512), batch_size=batch_size, backend='opencv')
+    cv2_batched_docs = cv2_processor([page for doc in docs for page in doc])
+    assert len(cv2_batched_docs) == len(batched_docs)
+    assert all(batch.dtype == tf.float32 for batch in cv2_batched_docs)
+    assert all(np.allclose(b1.numpy(), b2.numpy(), atol=1e-2) for b1, b2 in zip(batched_docs, cv2_batched_docs))
+    with pytest.raises(ValueError):
+        detection.DetectionPreProcessor(output_size=(512, 512), backend='my_backend')
+
+
+@pytest.mark.parametrize("backend", ['tensorflow', 'opencv'])
+def test_detpreprocessor_letterbox(backend):
+    pages = [np.full((1000, 300, 3), 255, dtype=np.uint8), np.full((900, 200, 3), 255, dtype=np.uint8),
+             np.full((300, 600, 3), 255, dtype=np.uint8)]
+    processor = detection.DetectionPreProcessor(output_size=(256, 256), batch_size=2, backend=backend,
+                                                preserve_aspect_ratio=True)
+    assert processor.get_resized_shape((1000, 300)) == (256, 77)
+    batches, valid_ratios = processor.letterbox_inputs(pages)
+    assert [batch.shape for batch in batches] == [(2, 256, 256, 3), (1, 256, 256, 3)]
+    assert np.allclose(valid_ratios[0], [[1, 77 / 256], [1, 57 / 256]]) and np.allclose(valid_ratios[1], [[.5, 1]])
+    # Padding to the right and to the bottom
+    assert np.all(batches[0][0, :, :77].numpy() == .5) and np.all(batches[0][0, :, 77:].numpy() == -.5)
+    assert np.all(batches[1][0, 128:].numpy() == -.5)
+    # Variable padded shapes
+    processor.pad_multiple = 32
+    batches, valid_ratios = processor.letterbox_inputs(pages)
+    assert [batch.shape for batch in batches] == [(2, 256, 96, 3), (1, 128, 256, 3)]
+    assert np.allclose(valid_ratios[0], [[1, 77 / 96], [1, 57 / 96]]) and np.allclose(valid_ratios[1], [[1, 1]])
+
 
 def test_dbpostprocessor():
     postprocessor = detection.DBPostProcessor()
@@ -48,6 +77,14 @@ def test_dbpostprocessor():
     assert all(np.all(np.logical_and(sample[:4] >= 0, sample[:4] <= 1)) for sample in out)
     # Repr
     assert repr(postprocessor) == 'DBPostProcessor(box_thresh=0.1, max_candidates=1000)'
+    # Padded inputs
+    valid_ratios = np.array([[.5, 1], [1, .25]])
+    unpadded = postprocessor(mock_batch, valid_ratios)
+    assert all(np.all(np.logical_and(sample[:, :4] >= 0, sample[:, :4] <= 1)) for sample in unpadded)
+    assert np.allclose(unpadded[0][:, [1, 3]], np.clip(out[0][:, [1, 3]] / .5, 0, 1))
+    assert np.allclose(unpadded[1][:, [0, 2]], np.clip(out[1][:, [0, 2]] / .25, 0, 1))
+    # Concurrent post-processing of the pages
+    assert all(np.array_equal(b1, b2) for b1, b2 in zip(out, detection.DBPostProcessor(workers=2)(mock_batch)))
     # Edge case when the expanded points of the polygon has two lists
     issue_points = np.array([
         [869, 561],
@@ -79,6 +116,30 @@ def test_dbpostprocessor():
     assert isinstance(out, tuple) and len(out) == 4
 
 
+def test_dbpostprocessor_vectorized():
+    postprocessor = detection.DBPostProcessor(vectorized=True)
+    mock_batch = dict(proba_map=tf.random.uniform(shape=[2, 512, 512, 1], minval=0, maxval=1))
+    out = postprocessor(mock_batch)
+    assert isinstance(out, list) and len(out) == 2
+    assert all(isinstance(sample, np.ndarray) and sample.shape[1] == 5 for sample in out)
+    assert all(np.all(np.logical_and(sample >= 0, sample <= 1)) for sample in out)
+
+    # Same boxes as the contour-based post-processing on well-separated words
+    pred = np.zeros((512, 512), dtype=np.float32)
+    pred[100:120, 50:150] = 0.9
+    pred[200:215, 300:340] = 0.8
+    pred[400:430, 20:500] = 0.7
+    bitmap = (pred > postprocessor.bin_thresh).astype(np.float32)
+    boxes = postprocessor.bitmap_to_boxes(pred, bitmap)
+    ref_boxes = detection.DBPostProcessor().bitmap_to_boxes(pred, bitmap)
+    assert boxes.shape == ref_boxes.shape == (3, 5)
+    # Sort by ymin
+    boxes, ref_boxes = boxes[boxes[:, 1].argsort()], ref_boxes[ref_boxes[:, 1].argsort()]
+    assert np.allclose(boxes, ref_boxes, atol=2 / 512)
+    # Empty map
+    assert postprocessor.bitmap_to_boxes(pred, np.zeros_like(bitmap)).shape == (0, 5)
+
+
 def test_db_resnet50_training_mode():
     model = detection.db_resnet50(pretrained=False)
     assert isinstance(model, tf.keras.Model)
@@ -140,6 +201,65 @@ def test_detectionpredictor(mock_pdf):  # noqa: F811
     return predictor
 
 
+def test_detectionpredictor_compiled(mock_pdf):
+
+    batch_size = 4
+    predictor = detection.DetectionPredictor(
+        detection.DetectionPreProcessor(output_size=(512, 512), batch_size=batch_size),
+        detection.db_resnet50(input_shape=(512, 512, 3)),
+        detection.DBPostProcessor(),
+        compiled=True,
+    )
+    predictor.warmup()
+    assert list(predictor._graphs.keys()) == [(batch_size, 512, 512, 3)]
+
+    pages = DocumentFile.from_pdf(mock_pdf).as_images()[:5]
+    out = predictor(pages)
+    # Incomplete batches are padded: no retracing
+    assert len(predictor._graphs) == 1
+    assert len(out) == len(pages)
+    assert all(isinstance(boxes, np.ndarray) and boxes.shape[1] == 5 for boxes in out)
+
+
+def test_detectionpredictor_tiled():
+
+    predictor = detection.DetectionPredictor(
+        detection.DetectionPreProcessor(output_size=(256, 256), batch_size=2),
+        detection.db_resnet50(input_shape=(256, 256, 3)),
+        detection.DBPostProcessor(),
+        tiled=True,
+    )
+    # Tiles cover the page, with the minimal overlap
+    tiles = predictor.get_tiles((600, 500))
+    assert len(tiles) == 9
+    assert tiles[0] == (0, 0, 256, 256) and tiles[-1] == (244, 344, 500, 600)
+    assert all(tile[2] - tile[0] == 256 and tile[3] - tile[1] == 256 for tile in tiles)
+    assert predictor.get_tiles((200, 100)) == [(0, 0, 100, 200)]
+
+    pages = [(255 * np.random.rand(600, 500, 3)).astype(np.uint8), (255 * np.random.rand(200, 100, 3)).astype(np.uint8)]
+    out = predictor(pages)
+    assert len(out) == 2
+    assert all(isinstance(boxes, np.ndarray) and boxes.shape[1] == 5 for boxes in out)
+    assert all(np.all(boxes[:, :4] >= 0) and np.all(boxes[:, :4] <= 1) for boxes in out)
+
+    # Boxes at tile seams
+    tiles = [(0, 0, 100, 100), (80, 0, 180, 100)]
+    boxes = np.array([[70, 10, 100, 20, .9], [80, 10, 110, 20, .8], [10, 50, 30, 60, .7], [150, 50, 170, 60, .6]])
+    tile_idxs = np.array([0, 1, 0, 1])
+    merged = predictor.merge_tile_boxes(boxes, tile_idxs, tiles)
+    assert np.all(merged == np.array([[70, 10, 110, 20, .9], [10, 50, 30, 60, .7], [150, 50, 170, 60, .6]]))
+    # Two words overlapping the same box are not chained together
+    chained_boxes = np.array([[75, 10, 90, 20, .9], [95, 10, 100, 20, .8], [80, 10, 120, 20, .7]])
+    merged = predictor.merge_tile_boxes(chained_boxes, np.array([0, 0, 1]), tiles)
+    assert np.all(merged == np.array([[75, 10, 90, 20, .9], [80, 10, 120, 20, .8]]))
+    predictor.tile_merge = 'nms'
+    assert np.all(predictor.merge_tile_boxes(boxes, tile_idxs, tiles) == boxes[[0, 2, 3]])
+
+    with pytest.raises(ValueError):
+        detection.DetectionPredictor(predictor.pre_processor, predictor.model, predictor.post_processor,
+                                     tile_merge='average')
+
+
 @pytest.mark.parametrize(
     "arch_name",
     [
@@ -152,6 +272,8 @@ def test_detection_zoo(arch_name):
     predictor = detection.zoo.detection_predictor(arch_name, pretrained=False)
     # object check
     assert isinstance(predictor, detection.DetectionPredictor)
+    assert predictor.post_processor.workers == 1
+    assert detection.zoo.detection_predictor(arch_name, pretrained=False, workers=4).post_processor.workers == 4
     input_tensor = tf.random.uniform(shape=[2, 1024, 1024, 3], minval=0, maxval=1)
     out = predictor(input_tensor)
     assert isinstance(out, list)
@@ -6,6 +6,7 @@ import tensorflow as tf
 from doctr.models import recognition
 from doctr.documents import DocumentFile
 from doctr.models import extract_crops
+from doctr.datasets.multithreading import multithread_exec
 
 
 def test_recopreprocessor(mock_pdf):  # noqa: F811
@@ -34,6 +35,24 @@ def test_recopreprocessor(mock_pdf):  # noqa: F811
     # Repr
     assert repr(processor) == 'RecognitionPreProcessor(output_size=(256, 128), mean=[0.5 0.5 0.5], std=[1. 1. 1.])'
 
+    # Aspect-ratio buckets
+    processor = recognition.RecognitionPreProcessor(output_size=(32, 128), batch_size=batch_size, num_buckets=4)
+    assert processor.bucket_widths == [32, 64, 96, 128]
+    crops = [np.zeros((32, width, 3), dtype=np.uint8) for width in (200, 10, 60, 40, 120, 20, 0)]
+    batched_crops, order = processor.bucket_inputs(crops)
+    assert sorted(order.tolist()) == list(range(len(crops)))
+    assert sum(batch.shape[0] for batch in batched_crops) == len(crops)
+    assert [batch.shape[2] for batch in batched_crops] == [32, 64, 128]
+    assert all(batch.shape[0] <= batch_size and batch.dtype == tf.float32 for batch in batched_crops)
+
+    # OpenCV backend
+    processor = recognition.RecognitionPreProcessor(output_size=(32, 128), batch_size=batch_size)
+    cv2_processor = recognition.RecognitionPreProcessor(output_size=(32, 128), batch_size=batch_size, backend='opencv')
+    crops = [(255 * np.random.rand(16, width, 3)).astype(np.uint8) for width in (200, 10, 60, 40, 120, 20)]
+    batched_crops, cv2_batched_crops = processor(crops), cv2_processor(crops)
+    assert [batch.shape for batch in cv2_batched_crops] == [batch.shape for batch in batched_crops]
+    assert all(np.allclose(b1.numpy(), b2.numpy(), atol=1e-2) for b1, b2 in zip(batched_crops, cv2_batched_crops))
+
 
 @pytest.mark.parametrize(
     "arch_name, input_shape, output_size",
@@ -74,6 +93,58 @@ def test_sar_training():
     assert out.numpy().shape == (batch_size, *output_size)
 
 
+def test_sar_early_exit(mock_vocab):
+    input_shape = (32, 128, 3)
+    reco_model = recognition.sar_vgg16_bn(vocab=mock_vocab, input_shape=input_shape)
+    post_processor = recognition.SARPostProcessor(mock_vocab)
+    input_tensor = tf.random.uniform(shape=[4, *input_shape], minval=0, maxval=1)
+    out = reco_model(input_tensor, training=False)
+
+    # Same predictions, with the same output shape
+    reco_model.decoder.early_exit = True
+    early_out = reco_model(input_tensor, training=False)
+    assert early_out.shape == out.shape
+    assert post_processor(early_out) == post_processor(out)
+    # Sequences ending at the first step
+    bias = reco_model.decoder.output_dense.bias
+    bias.assign(tf.tensor_scatter_nd_update(bias, [[len(mock_vocab)]], [100.]))
+    early_out = reco_model(input_tensor, training=False)
+    assert early_out.shape == out.shape and post_processor(early_out) == [''] * 4
+    # Graph mode
+    graph_out = tf.function(lambda x: reco_model(x, training=False))(input_tensor)
+    assert np.allclose(graph_out.numpy(), early_out.numpy(), atol=1e-5)
+
+
+def test_sar_fused(mock_vocab):
+    input_shape = (32, 128, 3)
+    reco_model = recognition.sar_vgg16_bn(vocab=mock_vocab, input_shape=input_shape)
+    input_tensor = tf.random.uniform(shape=[4, *input_shape], minval=0, maxval=1)
+    out = reco_model(input_tensor, training=False)
+
+    # Same weights, same outputs
+    reco_model.decoder.fused = True
+    fused_out = reco_model(input_tensor, training=False)
+    assert fused_out.shape == out.shape
+    assert np.allclose(fused_out.numpy(), out.numpy(), atol=1e-4)
+    reco_model.decoder.early_exit = True
+    graph_out = tf.function(lambda x: reco_model(x, training=False))(input_tensor)
+    assert recognition.SARPostProcessor(mock_vocab)(graph_out) == recognition.SARPostProcessor(mock_vocab)(out)
+    # Training still relies on the keras layers
+    labels = tf.zeros((4, reco_model.max_length), dtype=tf.int32)
+    assert reco_model(input_tensor, labels=labels, training=True).shape == out.shape
+
+
+def test_sar_attention_cache():
+    attention_module = recognition.sar.AttentionModule(16)
+    features = tf.random.uniform(shape=[2, 4, 16, 8], minval=0, maxval=1)
+    hidden_state = tf.random.uniform(shape=[2, 1, 1, 32], minval=0, maxval=1)
+    glimpse = attention_module(features, hidden_state)
+    features_projection = attention_module.project_features(features)
+    assert features_projection.shape == (2, 4, 16, 16)
+    cached_glimpse = attention_module(features, hidden_state, features_projection)
+    assert np.allclose(cached_glimpse.numpy(), glimpse.numpy(), atol=1e-6)
+
+
 @pytest.mark.parametrize(
     "post_processor, input_shape",
     [
@@ -87,10 +158,75 @@ def test_reco_postprocessors(post_processor, input_shape, mock_vocab):
     assert isinstance(decoded, list) and all(isinstance(word, str) for word in decoded)
     assert len(decoded) == input_shape[0]
     assert all(char in mock_vocab for word in decoded for char in word)
+    # Confidence scores
+    logits = tf.random.normal(shape=input_shape, stddev=5)
+    words, confidences = processor.decode(logits)
+    assert words == processor(logits)
+    assert confidences.shape == (input_shape[0],) and np.all((confidences > 0) & (confidences <= 1))
     # Repr
     assert repr(processor) == f'{post_processor}(vocab_size={len(mock_vocab)})'
 
 
+def test_ctc_backends(mock_vocab):
+    logits = tf.random.normal(shape=[64, 32, len(mock_vocab) + 1], stddev=5)
+    # Peaked blank & repeated classes
+    path = [len(mock_vocab), 3, 3, 5, len(mock_vocab), 5] + [len(mock_vocab)] * 26
+    logits = tf.concat([logits, 10 * tf.one_hot([path], len(mock_vocab) + 1)], 0)
+    words, confidences = recognition.CTCPostProcessor(mock_vocab).decode(logits)
+    tf_words, tf_confidences = recognition.CTCPostProcessor(mock_vocab, backend='tensorflow').decode(logits)
+    assert words == tf_words and words[-1] == mock_vocab[3] + mock_vocab[5] * 2
+    assert np.allclose(confidences, tf_confidences)
+    # Probability of the least likely step of the best path
+    assert np.allclose(confidences, tf.reduce_min(tf.reduce_max(tf.nn.softmax(logits), -1), -1).numpy(), atol=1e-6)
+
+    with pytest.raises(ValueError):
+        recognition.CTCPostProcessor(mock_vocab, backend='torch')
+
+
+def test_ctc_beam_search(mock_vocab):
+    logits = tf.random.normal(shape=[16, 32, len(mock_vocab) + 1], stddev=3)
+    # Same results as the tensorflow implementation
+    words, confidences = recognition.CTCPostProcessor(mock_vocab, beam_width=5).decode(logits)
+    tf_words, tf_confidences = recognition.CTCPostProcessor(mock_vocab, backend='tensorflow', beam_width=5).decode(
+        logits
+    )
+    assert words == tf_words and np.allclose(confidences, tf_confidences, atol=1e-5)
+    # The most likely sequence is found even when it differs from the best path (two blanks)
+    log_probs = np.log(np.array([[[0.4, 0.01, 0.59], [0.4, 0.01, 0.59]]]))
+    labels, log_likelihoods = recognition.ctc_beam_search(log_probs, beam_width=4)
+    assert labels.tolist() == [[0, -1]] and np.isclose(np.exp(log_likelihoods[0]), 0.4 * 0.4 + 2 * 0.4 * 0.59)
+    # Confidences on the same scale as best path decoding
+    path = [len(mock_vocab), 3, 3, 5, len(mock_vocab), 5] + [len(mock_vocab)] * 26
+    confident_logits = tf.random.normal(shape=[4, 32, len(mock_vocab) + 1], stddev=.5)
+    confident_logits += 10 * tf.one_hot([path] * 4, len(mock_vocab) + 1)
+    greedy_words, greedy_confidences = recognition.CTCPostProcessor(mock_vocab).decode(confident_logits)
+    for backend in ('numpy', 'tensorflow'):
+        words, confidences = recognition.CTCPostProcessor(mock_vocab, backend=backend, beam_width=8).decode(
+            confident_logits
+        )
+        assert words == greedy_words and confidences.dtype == np.float32
+        assert np.all(confidences >= greedy_confidences) and np.all(confidences - greedy_confidences < 0.1)
+
+    # Lexicon
+    lexicon = recognition.Lexicon(mock_vocab, words=["invoice", "total"], patterns=[r"\d{2}/[0-9]{2}", "[A-C]{1,2}"])
+    assert repr(lexicon).startswith("Lexicon(num_states=")
+    assert all(word in lexicon for word in ("invoice", "total", "12/05", "A", "CB"))
+    assert all(word not in lexicon for word in ("", "invoic", "1/05", "ABC", "D"))
+    processor = recognition.CTCPostProcessor(mock_vocab, beam_width=5, lexicon=lexicon)
+    assert processor.decode(logits)[1].shape == (16,)
+    # The most likely character of the last step is not allowed
+    path = [mock_vocab.index(char) for char in "totai"]
+    log_probs = np.full((1, 5, len(mock_vocab) + 1), -10.)
+    log_probs[0, np.arange(5), path] = 0
+    log_probs[0, 4, mock_vocab.index("l")] = -0.5
+    assert recognition.CTCPostProcessor(mock_vocab).decode(log_probs)[0] == ["totai"]
+    assert processor.decode(log_probs)[0] == ["total"]
+    with pytest.raises(ValueError):
+        recognition.CTCPostProcessor(mock_vocab, backend='tensorflow', lexicon=lexicon)
+    with pytest.raises(ValueError):
+        recognition.CTCPostProcessor(mock_vocab, beam_width=0)
+
+
 @pytest.fixture(scope="session")
 def test_recognitionpredictor(mock_pdf, mock_vocab):  # noqa: F811
 
@@ -111,6 +247,9 @@ def test_recognitionpredictor(mock_pdf, mock_vocab):  # noqa: F811
     # One prediction per crop
     assert len(out) == boxes.shape[0]
     assert all(isinstance(charseq, str) for charseq in out)
+    # Confidence scores
+    charseqs, confidences = predictor.predict(crops)
+    assert charseqs == out and confidences.shape == (boxes.shape[0],)
 
     # Dimension check
     with pytest.raises(ValueError):
@@ -120,6 +259,55 @@ def test_recognitionpredictor(mock_pdf, mock_vocab):  # noqa: F811
     return predictor
 
 
+def test_recognitionpredictor_compiled(mock_vocab):
+
+    batch_size = 4
+    predictor = recognition.RecognitionPredictor(
+        recognition.RecognitionPreProcessor(output_size=(32, 128), batch_size=batch_size),
+        recognition.sar_vgg16_bn(vocab=mock_vocab, input_shape=(32, 128, 3)),
+        recognition.SARPostProcessor(mock_vocab),
+        compiled=True,
+    )
+    predictor.warmup()
+    assert list(predictor._graphs.keys()) == [(batch_size, 32, 128, 3)]
+
+    crops = [(255 * np.random.rand(16, width, 3)).astype(np.uint8) for width in (20, 40, 60, 80, 100, 120)]
+    out = predictor(crops)
+    # Incomplete batches are padded: no retracing
+    assert len(predictor._graphs) == 1
+    assert len(out) == len(crops) and all(isinstance(charseq, str) for charseq in out)
+    # Same results as eager mode
+    predictor.compiled = False
+    assert predictor(crops) == out
+
+
+def test_recognition_scheduler(mock_pdf, test_recognitionpredictor):
+
+    scheduler = recognition.RecognitionScheduler(test_recognitionpredictor, max_delay=0.05)
+    assert scheduler.batch_size == test_recognitionpredictor.pre_processor.batch_size
+
+    page = DocumentFile.from_pdf(mock_pdf).as_images()[0]
+    requests = [
+        extract_crops(page, np.array([[0, 0, 0.25, 0.25], [0.5, 0.5, 1., 1.]], dtype=np.float32)[:num_crops])
+        for num_crops in (1, 2, 1, 2, 2)
+    ]
+    # Concurrent callers
+    out = list(multithread_exec(scheduler, requests, threads=len(requests)))
+    assert [len(charseqs) for charseqs in out] == [len(crops) for crops in requests]
+    assert all(isinstance(charseq, str) for charseqs in out for charseq in charseqs)
+    # Same results as the predictor
+    assert out[1] == test_recognitionpredictor(requests[1])
+    charseqs, confidences = scheduler.predict(requests[1])
+    assert charseqs == out[1] and np.allclose(confidences, test_recognitionpredictor.predict(requests[1])[1])
+    # No crop
+    assert scheduler([]) == []
+
+    # Dimension check
+    with pytest.raises(ValueError):
+        input_crop = (255 * np.random.rand(1, 128, 64, 3)).astype(np.uint8)
+        _ = scheduler([input_crop])
+
+
 @pytest.mark.parametrize(
     "arch_name",
     [